@@ -4,6 +4,49 @@ Sep 7, 2025, Papamidas (DM1CR)
 
 """
 import machine
+import time
+import instrumentation
+from array import array
+try:
+    from micropython import const
+except ImportError:
+    def const(x):
+        return x
+
+# Address pointer register values
+
+_AD7415_TEMP_REG   = const(0x00)   #temperature value register (read only)
+_AD7415_CONFIG_REG = const(0x01)   #configuration register (read/write)
+
+# Configuration register bits
+
+_AD7415_PD       = const(0x80)     #PD = 1: full power-down
+_AD7415_FLTR     = const(0x40)     #FLTR = 1: SDA/SCL filters enabled (power-on)
+_AD7415_ONE_SHOT = const(0x04)     #one-shot conversion, used in power-down
+
+_AD7415_CONFIG_POWER_ON = const(0x40)
+
+# A conversion takes up to 29 µs, in full power mode a new one starts
+# every 800 µs
+
+_AD7415_CONVERSION_US = const(29)
+_AD7415_UPDATE_US     = const(800)
+
+def code_to_celsius(code):
+    """converts a 16-bit temperature register word to °C"""
+    adcval = (code >> 6) & 0x1ff
+    if code & 0x8000:
+        #negative celsius temperature
+        adcval -= 512
+    return(adcval/4)
+
+def code_to_quarters(code):
+    """converts a 16-bit temperature register word to integer 1/4 °C, the
+       signed 10-bit value itself"""
+    adcval = (code >> 6) & 0x3ff
+    if adcval & 0x200:
+        adcval -= 0x400
+    return adcval
 
 class AD7415:
 
@@ -23,6 +66,25 @@ class AD7415:
         """
         self._i2c = i2c
         self._adr = adr
+        # preallocated receive and configuration write buffers
+        self._inb = bytearray(2)
+        self._cfg = bytearray(2)
+        self._cfg[0] = _AD7415_CONFIG_REG
+        # address pointer and configuration register as last written,
+        # None while unknown; the pointer is 0 after power-on
+        self._pointer = None
+        self._config = None
+        # ticks_us of the last one-shot trigger
+        self._oneshot_ticks = 0
+
+    @property
+    def config(self):
+        """Returns cached configuration register value, None if unknown"""
+        return self._config
+
+    @property
+    def powered_down(self):
+        return self._config is not None and (self._config & _AD7415_PD) != 0
 
     def __enter__(self):
         return self
@@ -37,13 +99,105 @@ class AD7415:
             adcval -= 512
         return(adcval/4)
             
+    def read_raw(self):
+        """returns the two temperature register bytes in the shared buffer;
+           the pointer is only written (with repeated start) when it is not
+           already on the temperature register, otherwise a plain two-byte
+           read takes about half the bus time"""
+        _t = instrumentation.start()
+        try:
+            if self._pointer == _AD7415_TEMP_REG:
+                self._i2c.readfrom_into(self._adr, self._inb)
+            else:
+                self._i2c.readfrom_mem_into(self._adr, _AD7415_TEMP_REG, self._inb)
+                self._pointer = _AD7415_TEMP_REG
+        except OSError:
+            # the device may have been reset, write the pointer next time
+            self._pointer = None
+            raise
+        instrumentation.stop(instrumentation.I2C, _t)
+        return(self._inb)
+
+    def read_config(self):
+        """Reads Configuration Register and updates the cached value"""
+        self._i2c.readfrom_mem_into(self._adr, _AD7415_CONFIG_REG, memoryview(self._inb)[0:1])
+        self._pointer = _AD7415_CONFIG_REG
+        self._config = self._inb[0]
+        return self._config
+
+    def write_config(self, value):
+        """Writes Configuration Register, leaves the pointer on it"""
+        self._cfg[1] = value
+        self._i2c.writeto(self._adr, self._cfg)
+        self._pointer = _AD7415_CONFIG_REG
+        # the one-shot bit clears itself
+        self._config = value & ~_AD7415_ONE_SHOT
+
+    def cached_config(self):
+        """cached configuration register, read from the device once while
+           unknown so that a configuration already set is kept"""
+        if self._config is None:
+            self.read_config()
+        return self._config
+
+    def power_down(self, on=True):
+        """full power-down between one-shot conversions, less self-heating;
+           only written when the mode changes"""
+        value = self.cached_config()
+        value = (value | _AD7415_PD) if on else (value & ~_AD7415_PD)
+        if value != self._config:
+            self.write_config(value)
+
+    def one_shot(self):
+        """starts one conversion, in power-down mode"""
+        self.write_config(self.cached_config() | _AD7415_ONE_SHOT)
+        self._oneshot_ticks = time.ticks_us()
+
+    def wait_conversion(self):
+        """waits until the last one-shot conversion has completed"""
+        _left = _AD7415_CONVERSION_US - time.ticks_diff(time.ticks_us(), self._oneshot_ticks)
+        if _left > 0:
+            time.sleep_us(_left)
+
+    def read_oneshot(self):
+        """one-shot conversion and read, the device stays powered down"""
+        self.one_shot()
+        self.wait_conversion()
+        return self.read_raw()
+
+    def read_code(self):
+        """returns the 16-bit temperature register word, a fresh one-shot
+           conversion while powered down"""
+        inb = self.read_oneshot() if self.powered_down else self.read_raw()
+        return (inb[0] << 8) | inb[1]
+
+    def read_many(self, n, codes=None):
+        """reads n temperature register words into codes (array('H') of n,
+           allocated if None), one conversion each: paced by the 800 µs
+           update period in full power mode, one-shots in power-down;
+           the words are two's complement, sign-convert each before
+           averaging: sum(code_to_quarters(c) for c in codes) / n / 4 °C"""
+        if codes is None:
+            codes = array('H', [0] * n)
+        _period = 0 if self.powered_down else _AD7415_UPDATE_US
+        _t0 = time.ticks_us()
+        for _i in range(n):
+            if _i and _period:
+                _left = _period - time.ticks_diff(time.ticks_us(), _t0)
+                if _left > 0:
+                    time.sleep_us(_left)
+                _t0 = time.ticks_add(_t0, _period)
+            codes[_i] = self.read_code()
+        return codes
+
+    def read_quarters(self):
+        """returns the temperature in integer 1/4 °C, no float allocated"""
+        return code_to_quarters(self.read_code())
+
     def read_Temperature(self) -> float:
-        outb = bytearray(1)
-        outb[0] = 0x00
-        self._i2c.writeto(self._adr, outb)
-        inb = bytearray(2)
-        self._i2c.readfrom_into(self._adr, inb)
-        return(self.bytearray_to_celsius(inb))
+        if self.powered_down:
+            return(self.bytearray_to_celsius(self.read_oneshot()))
+        return(self.bytearray_to_celsius(self.read_raw()))
     
 if __name__ == "__main__":
     # Hello World!
@@ -93,6 +247,60 @@ if __name__ == "__main__":
         inb[1] = 0b00000000
         print( "125°C", inb[0], inb[1], ad7415.bytearray_to_celsius(inb) )
         
+        import gc
+        if hasattr(gc, 'mem_alloc'):
+            print("heap bytes allocated by 10000 raw reads, should be 0: ", end="")
+            gc.collect()
+            n = 10000
+            a0 = gc.mem_alloc()
+            while n:
+                ad7415.read_raw()
+                n -= 1
+            a1 = gc.mem_alloc()
+            print(a1 - a0)
+            assert a1 - a0 == 0
+        else:
+            #CPython with simMachine: tracemalloc peak of a warm read loop; the
+            #simulated bus allocates itself, so the reads go to a bus that
+            #does nothing and every byte traced is the driver's own; 250
+            #loops keep the loop counter among the cached small ints
+            import tracemalloc
+            class _idleBus:
+                def readfrom_into(self, addr, buf, stop=True):
+                    pass
+                def readfrom_mem_into(self, addr, memaddr, buf):
+                    pass
+            n = 250
+            ad7415.read_raw()   #pointer on the temperature register
+            _i2c, ad7415._i2c = ad7415._i2c, _idleBus()
+            for _ in range(10):
+                ad7415.read_raw()
+            tracemalloc.start()
+            a0 = tracemalloc.get_traced_memory()[0]
+            while n:
+                ad7415.read_raw()
+                n -= 1
+            a1 = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            ad7415._i2c = _i2c
+            print("peak bytes, 250 raw reads, should be 0: ", a1 - a0)
+            assert a1 - a0 == 0
+
+        #the pointer is written once, later reads are plain two-byte reads
+        if hasattr(i2c, 'transactions'):
+            ad7415.read_raw()
+            b0 = i2c.bytes
+            ad7415.read_raw()
+            print("bus bytes per cached-pointer read: ", i2c.bytes - b0)
+
+        #one-shot conversions in power-down, batch read
+        ad7415.power_down()
+        print("config: ", hex(ad7415.read_config()), "powered down: ", ad7415.powered_down)
+        codes = ad7415.read_many(8)
+        print("read_many: ", [code_to_celsius(c) for c in codes])
+        ad7415.power_down(False)
+        print("config: ", hex(ad7415.read_config()))
+
         #now read in the current temperature from the actual device:
         for cnt in range(100):
             print("Temperature: ", ad7415.read_Temperature())
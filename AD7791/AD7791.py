@@ -4,68 +4,247 @@ Sep 7, 2025, Papamidas (DM1CR)
 
 """
 import machine
+import instrumentation
+try:
+    from micropython import const
+except ImportError:
+    def const(x):
+        return x
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 # Status register bits
 
-__AD7791_STATUS_REG = 0x00     #RS1 = 0 RS0 = 0: Status register (read only)
-__AD7791_MODE_REG   = 0x10     #RS1 = 0 RS0 = 1: Mode register (read/write)
-__AD7791_FILTER_REG = 0x20     #RS1 = 1 RS0 = 0: Filter register (read/write)
-__AD7791_DATA_REG   = 0x30     #RS1 = 1 RS0 = 1: Data register (read only)
+_AD7791_STATUS_REG = const(0x00)     #RS1 = 0 RS0 = 0: Status register (read only)
+_AD7791_MODE_REG   = const(0x10)     #RS1 = 0 RS0 = 1: Mode register (read/write)
+_AD7791_FILTER_REG = const(0x20)     #RS1 = 1 RS0 = 0: Filter register (read/write)
+_AD7791_DATA_REG   = const(0x30)     #RS1 = 1 RS0 = 1: Data register (read only)
 
-__AD7791_READ_OP    = 0x08     #R = 1: next operation is read specified register
-__AD7791_WRITE_OP   = 0x00     #R = 0: next operation is write specified register
+_AD7791_READ_OP    = const(0x08)     #R = 1: next operation is read specified register
+_AD7791_WRITE_OP   = const(0x00)     #R = 0: next operation is write specified register
 
-__AD7791_CONTINUOUS_READ = 0x04 #CREAD = 1: Continuous read of Data register
+_AD7791_CONTINUOUS_READ = const(0x04) #CREAD = 1: Continuous read of Data register
 
-__AD7791_CHANSEL_AIN   = 0x00   #CH1 = 0 CH0 = 0: AIN(+)-AIN(-)
-__AD7791_CHANSEL_SHORT = 0x02   #CH1 = 1 CH0 = 0: AIN(-)-AIN(-)
-__AD7791_CHANSEL_VDD   = 0x03   #CH1 = 1 CH0 = 1: Vdd Monitor (Vdd/5, Vref=1.17V onchip)
+_AD7791_CHANSEL_AIN   = const(0x00)   #CH1 = 0 CH0 = 0: AIN(+)-AIN(-)
+_AD7791_CHANSEL_SHORT = const(0x02)   #CH1 = 1 CH0 = 0: AIN(-)-AIN(-)
+_AD7791_CHANSEL_VDD   = const(0x03)   #CH1 = 1 CH0 = 1: Vdd Monitor (Vdd/5, Vref=1.17V onchip)
 
 # Mode register bits
 
-__AD7791_CONTINUOUS_CONVERSION_MODE = 0x00 #MD1 = 0 MD0 = 0: Continuous conversion mode
-__AD7791_SINGLE_CONVERSION_MODE     = 0x80 #MD1 = 1 MD0 = 0: Single conversion mode
-__AD7791_POWER_DOWN_MODE            = 0xc0 #MD1 = 1 MD0 = 1: Power down mode
+_AD7791_CONTINUOUS_CONVERSION_MODE = const(0x00) #MD1 = 0 MD0 = 0: Continuous conversion mode
+_AD7791_SINGLE_CONVERSION_MODE     = const(0x80) #MD1 = 1 MD0 = 0: Single conversion mode
+_AD7791_POWER_DOWN_MODE            = const(0xc0) #MD1 = 1 MD0 = 1: Power down mode
 
-__AD7791_BURNOUT_CURRENT_DISABLE = 0x00 #BO = 0
-__AD7791_BURNOUT_CURRENT_ENABLE  = 0x08 #BO = 1
-__AD7791_UNIPOLAR_CODING = 0x04 #U/B = 1: set unipolar coding 0x000000..0xffffff
-__AD7791_BIPOLAR_CODING  = 0x00 #U/B = 0: set bipolar coding 0x000000..0x80000..0xffffff
-__AD7791_BUFFER_ENABLE = 0x02   #BUF = 1
-__AD7791_BUFFER_DISABLE = 0x00  #BUF = 0
+_AD7791_BURNOUT_CURRENT_DISABLE = const(0x00) #BO = 0
+_AD7791_BURNOUT_CURRENT_ENABLE  = const(0x08) #BO = 1
+_AD7791_UNIPOLAR_CODING = const(0x04) #U/B = 1: set unipolar coding 0x000000..0xffffff
+_AD7791_BIPOLAR_CODING  = const(0x00) #U/B = 0: set bipolar coding 0x000000..0x80000..0xffffff
+_AD7791_BUFFER_ENABLE = const(0x02)   #BUF = 1
+_AD7791_BUFFER_DISABLE = const(0x00)  #BUF = 0
 
-# Filter register bits
+_AD7791_MODE_POWER_ON = const(0x02)   #continuous conversion, bipolar, buffered
 
-__AD7791_NORMAL_MODE  = 0x00 #CLKDIV1 = 0 CLKDIV0 = 0: Normal Mode
-__AD7791_CLKDIV2_MODE = 0x10 #CLKDIV1 = 0 CLKDIV0 = 1: Clock Divided by 2
-__AD7791_CLKDIV4_MODE = 0x20 #CLKDIV1 = 1 CLKDIV0 = 0: Clock Divided by 4
-__AD7791_CLKDIV8_MODE = 0x30 #CLKDIV1 = 1 CLKDIV0 = 1: Clock Divided by 8
+# Filter register bits
 
-__AD7791_UPDATE_RATE_DEFAULT = 0x04 #65dB@50Hz/60Hz rejection
-__AD7791_FS2 = 0x04
-__AD7791_FS1 = 0x02
-__AD7791_FS0 = 0x01
+_AD7791_NORMAL_MODE  = const(0x00) #CLKDIV1 = 0 CLKDIV0 = 0: Normal Mode
+_AD7791_CLKDIV2_MODE = const(0x10) #CLKDIV1 = 0 CLKDIV0 = 1: Clock Divided by 2
+_AD7791_CLKDIV4_MODE = const(0x20) #CLKDIV1 = 1 CLKDIV0 = 0: Clock Divided by 4
+_AD7791_CLKDIV8_MODE = const(0x30) #CLKDIV1 = 1 CLKDIV0 = 1: Clock Divided by 8
+
+_AD7791_UPDATE_RATE_DEFAULT = const(0x04) #65dB@50Hz/60Hz rejection
+_AD7791_FS2 = const(0x04)
+_AD7791_FS1 = const(0x02)
+_AD7791_FS0 = const(0x01)
+
+_AD7791_FILTER_POWER_ON = const(0x04) #CDIV1, 16.6sps
+
+# Update rates in sps selected by FS2..FS0, divided by the clock divider,
+# a conversion settles after two update periods
+_AD7791_UPDATE_RATES = (120.0, 100.0, 33.3, 20.0, 16.6, 16.7, 13.3, 9.5)
+# the same as update periods in µs, integer math needs no heap
+_AD7791_PERIODS_US = (8333, 10000, 30030, 50000, 60241, 59880, 75188, 105263)
+
+# Filter register values by clock divider and update rate name
+
+_AD7791_CDIV = {
+    "CDIV1": _AD7791_NORMAL_MODE,
+    "CDIV2": _AD7791_CLKDIV2_MODE,
+    "CDIV4": _AD7791_CLKDIV4_MODE,
+    "CDIV8": _AD7791_CLKDIV8_MODE
+}
+_AD7791_FADC = {
+    "120sps" :  0,
+    "100sps" :  _AD7791_FS0,
+    "33.3sps":  _AD7791_FS1,
+    "20sps"  :  _AD7791_FS1 + _AD7791_FS0,
+    "16.6sps":  _AD7791_UPDATE_RATE_DEFAULT,
+    "16.7sps":  _AD7791_FS2 + _AD7791_FS0,
+    "13.3sps":  _AD7791_FS2 + _AD7791_FS1,
+    "9.5sps" :  _AD7791_FS2 + _AD7791_FS1 + _AD7791_FS0
+}
 
 # Conversion modes
 
-__AD7791_CONTINUOUS = 0
-__AD7791_SINGLE = 2
-__AD7791_POWERDOWN = 3
+_AD7791_CONTINUOUS = const(0)
+_AD7791_SINGLE = const(2)
+_AD7791_POWERDOWN = const(3)
+
+# Coding selectors for set_coding(), usable from outside this module
+
+UNIPOLAR_CODING = _AD7791_UNIPOLAR_CODING
+BIPOLAR_CODING = _AD7791_BIPOLAR_CODING
+
+# Channel selectors for start_single_conversion()
+
+CHANNEL_AIN = _AD7791_CHANSEL_AIN
+CHANNEL_SHORT = _AD7791_CHANSEL_SHORT
+CHANNEL_VDD = _AD7791_CHANSEL_VDD
+
+# The Vdd monitor converts Vdd/5 against the on-chip 1.17 V reference
+
+VDD_MONITOR_FULL_SCALE = 5 * 1.17
+
+def filter_value(cdiv, fadc):
+    """returns the filter register value for a clock divider and update
+       rate name, e.g. ("CDIV1", "16.6sps"), ValueError for unknown names"""
+    try:
+        return _AD7791_CDIV[cdiv] + _AD7791_FADC[fadc]
+    except KeyError:
+        raise ValueError("unknown filter setting %s %s" % (cdiv, fadc))
+
+class acquisitionProfile:
+    # ADC setting encoded once into the bytes that apply it: filter register
+    # write, for continuous profiles followed by the mode register write and
+    # the continuous read command, all sent in one SPI transaction
+    def __init__(self, cdiv, fadc, coding=_AD7791_UNIPOLAR_CODING, continuous=False):
+        """
+        Create profile, validated here
+
+        Args:
+            cdiv, fadc: filter setting as for AD7791.write_filter()
+            coding: UNIPOLAR_CODING or BIPOLAR_CODING, continuous profiles only,
+                    single conversions are always unipolar
+            continuous: start continuous conversions with continuous read
+        """
+        if coding != _AD7791_UNIPOLAR_CODING and coding != _AD7791_BIPOLAR_CODING:
+            raise ValueError("unknown coding")
+        self.rate = (cdiv, fadc)
+        self.filter = filter_value(cdiv, fadc)
+        self.continuous = continuous
+        self.coding = coding
+        seq = bytearray((_AD7791_FILTER_REG + _AD7791_WRITE_OP, self.filter))
+        self.mode = None
+        if continuous:
+            self.mode = _AD7791_CONTINUOUS_CONVERSION_MODE + \
+                        _AD7791_BURNOUT_CURRENT_DISABLE + coding + \
+                        _AD7791_BUFFER_ENABLE
+            seq += bytes((_AD7791_MODE_REG + _AD7791_WRITE_OP + _AD7791_CHANSEL_AIN,
+                          self.mode,
+                          _AD7791_DATA_REG + _AD7791_READ_OP + \
+                          _AD7791_CONTINUOUS_READ + _AD7791_CHANSEL_AIN))
+        # views starting at the filter write, the mode write and the
+        # continuous read command, so skipping unchanged registers is free
+        _seq = memoryview(bytes(seq))
+        self.seq = (_seq, _seq[2:], _seq[4:])
+
+    @property
+    def update_rate(self):
+        """update rate in sps"""
+        f = self.filter
+        return _AD7791_UPDATE_RATES[f & 0x07] / (1 << ((f >> 4) & 0x03))
+
+    def __str__(self):
+        return '%s %s %s%s' % (self.rate[0], self.rate[1],
+                               'bipolar' if self.coding == _AD7791_BIPOLAR_CODING else 'unipolar',
+                               ' continuous' if self.continuous else '')
+
+def raw_to_codes(raw, codes=None):
+    """unpacks big-endian 3-byte samples from raw into integer codes,
+       without codes a NumPy array is returned (host side)"""
+    if codes is None:
+        if np is None:
+            raise ValueError("codes array required without NumPy")
+        b = np.frombuffer(raw, dtype=np.uint8)
+        b = b[:len(b) // 3 * 3].reshape(-1, 3).astype(np.int32)
+        return (b[:, 0] << 16) | (b[:, 1] << 8) | b[:, 2]
+    k = 0
+    for n in range(len(codes)):
+        codes[n] = (raw[k] << 16) | (raw[k + 1] << 8) | raw[k + 2]
+        k += 3
+    return codes
+
+def codes_to_voltage(codes, ref_voltage, bipolar=False, out=None):
+    """converts integer codes to ADC voltages referred to ref_voltage in one pass,
+       without out a NumPy array is returned (host side)"""
+    if bipolar:
+        scale = ref_voltage / 0x800000
+        offset = -ref_voltage
+    else:
+        scale = ref_voltage / 0x1000000
+        offset = 0.0
+    if out is None:
+        if np is None:
+            raise ValueError("out array required without NumPy")
+        return np.asarray(codes, dtype=np.float64) * scale + offset
+    for n in range(len(codes)):
+        out[n] = codes[n] * scale + offset
+    return out
+
+def ref_microvolts(ref_voltage):
+    """Vref in integer µV for code_to_microvolts()"""
+    return int(ref_voltage * 1000000 + 0.5)
+
+def code_to_microvolts(code, ref_uv):
+    """converts a unipolar code to integer µV, rounded, without floats;
+       code (24 bits) and ref_uv (< 2**23) are split into 12-bit halves so
+       that every partial product stays in small-int range"""
+    _hi = code >> 12
+    _lo = code & 0xfff
+    _rh = ref_uv >> 12
+    _rl = ref_uv & 0xfff
+    return ((((_lo * _rl) >> 12) + _lo * _rh + _hi * _rl + 0x800) >> 12) + _hi * _rh
 
 class AD7791:
 
-    def __init__(self, spi, nRDY, ref_voltage=2.5):
+    def __init__(self, spi, nRDY, ref_voltage=2.5, cs=None):
         """
         Create AD7791 instance
 
         Args:
             spi: configured SPI bus
+            nRDY: pin object of DOUT/nRDY (the SPI MISO pin)
             ref_voltage: Vref value
+            cs: chip select pin object (output, idle high) when several
+                ADCs share the bus, None if CS is tied low
         """
         self._spi = spi
         self._nRDY = nRDY
+        self._cs = cs
         self._ref_voltage = ref_voltage
-        self._conversion_mode = __AD7791_CONTINUOUS
+        self._ref_uv = ref_microvolts(ref_voltage)
+        self._conversion_mode = _AD7791_CONTINUOUS
+        # continuous read (CREAD) active, the communications register then
+        # only accepts the exit command
+        self._cread_on = False
+        # shadow copies of the mode and filter registers, None while unknown
+        self._mode = None
+        self._filter = None
+        # preallocated transfer buffers, reused by every bus transaction so
+        # that reading registers and samples does not allocate on the heap
+        self._reset_seq = b'\xff\xff\xff\xff'
+        self._wr = bytearray(2)
+        self._wr1 = memoryview(self._wr)[0:1]
+        self._rd_cmd = bytearray(4)
+        self._rd_in = bytearray(4)
+        _cmd = memoryview(self._rd_cmd)
+        _in = memoryview(self._rd_in)
+        self._rd_cmd2 = _cmd[0:2]
+        self._rd_in2 = _in[0:2]
+        self._reg = _in[1:2]
+        self._data = _in[1:4]
+        self._cread = _in[0:3]
 
     @property
     def ref_voltage(self) -> float:
@@ -76,6 +255,7 @@ class AD7791:
     def ref_voltage(self, newrefvoltage):
         if(newrefvoltage >= 0.1 and newrefvoltage <= 5.0):
             self._ref_voltage = newrefvoltage
+            self._ref_uv = ref_microvolts(newrefvoltage)
         else:
             print("ref voltage out range, must be 0.1V..Vdd")
 
@@ -84,25 +264,78 @@ class AD7791:
         """Returns nRDY/DOUT/MISO pin object"""
         return self._nRDY
 
+    def ready(self):
+        """Returns True when a conversion result is waiting (nRDY low)"""
+        if self._cs is None:
+            return self._nRDY.value() == 0
+        # DOUT/nRDY is only driven while the chip is selected
+        self._cs.value(0)
+        rdy = self._nRDY.value() == 0
+        self._cs.value(1)
+        return rdy
+
+    def _select(self):
+        if self._cs is not None:
+            self._cs.value(0)
+
+    def _deselect(self):
+        if self._cs is not None:
+            self._cs.value(1)
+
+    @property
+    def mode(self):
+        """Returns cached mode register value, None if unknown"""
+        return self._mode
+
+    @property
+    def filter(self):
+        """Returns cached filter register value, None if unknown"""
+        return self._filter
+
     def reset(self):
         """Resets ADC to its default state"""
-        outbuf = bytearray(4)
-        outbuf[0] = 0xff
-        outbuf[1] = 0xff
-        outbuf[2] = 0xff
-        outbuf[3] = 0xff
-        self._spi.write(outbuf)
+        self._select()
+        self._spi.write(self._reset_seq)
+        self._deselect()
+        self._mode = _AD7791_MODE_POWER_ON
+        self._filter = _AD7791_FILTER_POWER_ON
+        self._conversion_mode = _AD7791_CONTINUOUS
+        self._cread_on = False
+
+    def sync(self):
+        """Resyncs the cached mode and filter registers from the chip"""
+        self.read_mode()
+        self.read_filter()
+
+    def _read_reg(self, cmd):
+        """writes cmd to the communications register and reads one byte back
+        in the same transfer, returns a view into the shared receive buffer"""
+        self._rd_cmd[0] = cmd
+        self._select()
+        self._spi.write_readinto(self._rd_cmd2, self._rd_in2)
+        self._deselect()
+        return self._reg
+
+    def _write_reg(self, cmd, value):
+        """writes cmd to the communications register followed by value"""
+        self._wr[0] = cmd
+        self._wr[1] = value
+        self._select()
+        self._spi.write(self._wr)
+        self._deselect()
+
+    def _write_mode(self, value, force=False, channel=_AD7791_CHANSEL_AIN):
+        """writes Mode Register unless the cached value already matches,
+           force for writes that trigger a conversion"""
+        if not force and value == self._mode:
+            return False
+        self._write_reg(_AD7791_MODE_REG + _AD7791_WRITE_OP + channel, value)
+        self._mode = value
+        return True
 
     def read_status(self):
         """Reads Status Register"""
-        outb = bytearray(1)
-        outb[0] = __AD7791_STATUS_REG + __AD7791_READ_OP
-        #print("outb = ", outb)
-        self._spi.write(outb)
-        inb = bytearray(1)
-        self._spi.readinto(inb)
-        #print("inb[0] hex = ", hex(inb[0]))
-        return inb
+        return self._read_reg(_AD7791_STATUS_REG + _AD7791_READ_OP)
         
     def print_status(self, status):
         """Prints the meaning of status register bits"""
@@ -130,17 +363,18 @@ class AD7791:
             print("channel selection Vdd Monitor")
                 
     def read_mode(self):
-        """Reads Mode Register"""
-        outb = bytearray(1)
-        outb[0] = __AD7791_MODE_REG + __AD7791_READ_OP
-        self._spi.write(outb)
-        inb = bytearray(1)
-        self._spi.readinto(inb)
-        return inb
+        """Reads Mode Register and updates the cached value"""
+        reg = self._read_reg(_AD7791_MODE_REG + _AD7791_READ_OP)
+        self._mode = reg[0]
+        return reg
     
     
-    def print_mode(self, mode):
-        """Prints the meaning of modes register bits"""
+    def print_mode(self, mode=None):
+        """Prints the meaning of modes register bits, default cached value"""
+        if mode is None:
+            mode = self._mode
+            if mode is None:
+                mode = self.read_mode()[0]
         print("mode register (hex): ", hex(mode))
         op = mode & 0xc0
         if op == 0x00:
@@ -167,39 +401,45 @@ class AD7791:
             print("!!!MR0 must be 0")
 
     def read_filter(self):
-        """Reads Filter Register"""
-        outb = bytearray(1)
-        outb[0] = __AD7791_FILTER_REG + __AD7791_READ_OP
-        self._spi.write(outb)
-        inb = bytearray(1)
-        self._spi.readinto(inb)
-        return inb
+        """Reads Filter Register and updates the cached value"""
+        reg = self._read_reg(_AD7791_FILTER_REG + _AD7791_READ_OP)
+        self._filter = reg[0]
+        return reg
 
     def write_filter(self, cdiv, fadc):
-        """Writes Filter Register"""
-        _cdiv = {
-            "CDIV1": __AD7791_NORMAL_MODE,
-            "CDIV2": __AD7791_CLKDIV2_MODE,
-            "CDIV4": __AD7791_CLKDIV4_MODE,
-            "CDIV8": __AD7791_CLKDIV8_MODE
-        }
-        _fadc = {
-            "120sps" :  0,
-            "100sps" :  __AD7791_FS0,
-            "33.3sps":  __AD7791_FS1,
-            "20sps"  :  __AD7791_FS1 + __AD7791_FS0,
-            "16.6sps":  __AD7791_UPDATE_RATE_DEFAULT,
-            "16.7sps":  __AD7791_FS2 + __AD7791_FS0,
-            "13.3sps":  __AD7791_FS2 + __AD7791_FS1,
-            "9.5sps" :  __AD7791_FS2 + __AD7791_FS1 + __AD7791_FS0
-        }
-        outb = bytearray(2)
-        outb[0] = __AD7791_FILTER_REG + __AD7791_WRITE_OP
-        outb[1] = _cdiv[cdiv] + _fadc[fadc]
-        self._spi.write(outb)
-
-    def print_filter(self, filter):
-        """Prints the meaning of filter register bits"""
+        """Writes Filter Register, skipped if the cached value matches"""
+        value = _AD7791_CDIV[cdiv] + _AD7791_FADC[fadc]
+        if value == self._filter:
+            return False
+        self._write_reg(_AD7791_FILTER_REG + _AD7791_WRITE_OP, value)
+        self._filter = value
+        return True
+
+    @property
+    def update_rate(self):
+        """Returns update rate in sps from the cached filter register"""
+        f = self._filter if self._filter is not None else _AD7791_FILTER_POWER_ON
+        return _AD7791_UPDATE_RATES[f & 0x07] / (1 << ((f >> 4) & 0x03))
+
+    def settling_time_ms(self):
+        """Returns settling time in ms for the active update rate"""
+        return 2000.0 / self.update_rate
+
+    def period_us(self):
+        """Returns update period in µs from the cached filter register"""
+        f = self._filter if self._filter is not None else _AD7791_FILTER_POWER_ON
+        return _AD7791_PERIODS_US[f & 0x07] << ((f >> 4) & 0x03)
+
+    def settling_time_us(self):
+        """Returns settling time in µs, also the single conversion time"""
+        return self.period_us() << 1
+
+    def print_filter(self, filter=None):
+        """Prints the meaning of filter register bits, default cached value"""
+        if filter is None:
+            filter = self._filter
+            if filter is None:
+                filter = self.read_filter()[0]
         print("filter register (hex): ", hex(filter))
         if filter & 0xc0 != 0:
             print("!!!FR7, FR6 must be 0")
@@ -219,47 +459,127 @@ class AD7791:
         
     def start_unipolar_single_conversion(self):
         """writes Mode Register for single normal AIN(+)-AIN(-) conversion"""
-        outb = bytearray(2)
-        outb[0] = __AD7791_MODE_REG + __AD7791_WRITE_OP + __AD7791_CHANSEL_AIN
-        outb[1] = __AD7791_SINGLE_CONVERSION_MODE + \
-                  __AD7791_BURNOUT_CURRENT_DISABLE + \
-                  __AD7791_UNIPOLAR_CODING + \
-                  __AD7791_BUFFER_ENABLE
-        self._spi.write(outb)
-        self._conversion_mode = __AD7791_SINGLE
+        # the write itself starts the conversion, so it is never skipped
+        self._write_mode(_AD7791_SINGLE_CONVERSION_MODE + \
+                         _AD7791_BURNOUT_CURRENT_DISABLE + \
+                         _AD7791_UNIPOLAR_CODING + \
+                         _AD7791_BUFFER_ENABLE, force=True)
+        self._conversion_mode = _AD7791_SINGLE
+
+    def start_single_conversion(self, channel, coding):
+        """writes Mode Register for a single conversion of channel, e.g. the
+           shorted input (CHANNEL_SHORT) for offset or CHANNEL_VDD"""
+        self._write_mode(_AD7791_SINGLE_CONVERSION_MODE + \
+                         _AD7791_BURNOUT_CURRENT_DISABLE + \
+                         coding + \
+                         _AD7791_BUFFER_ENABLE, force=True, channel=channel)
+        self._conversion_mode = _AD7791_SINGLE
 
     def set_coding(self, coding):
         """writes Mode Register for unipolar/bipolar conversion"""
         """mode should be either
-           __AD7791_UNIPOLAR_CODING or __AD7791_BIPOLAR_CODING """
-        outb = bytearray(2)
-        outb[0] = __AD7791_MODE_REG + __AD7791_WRITE_OP + __AD7791_CHANSEL_AIN
-        outb[1] = __AD7791_CONTINUOUS_CONVERSION_MODE + \
-                  __AD7791_BURNOUT_CURRENT_DISABLE + \
-                  coding + \
-                  __AD7791_BUFFER_ENABLE
-        self._spi.write(outb)
-        self._conversion_mode = __AD7791_CONTINUOUS
+           _AD7791_UNIPOLAR_CODING or _AD7791_BIPOLAR_CODING """
+        written = self._write_mode(_AD7791_CONTINUOUS_CONVERSION_MODE + \
+                                   _AD7791_BURNOUT_CURRENT_DISABLE + \
+                                   coding + \
+                                   _AD7791_BUFFER_ENABLE)
+        self._conversion_mode = _AD7791_CONTINUOUS
+        return written
 
     def start_continuous_conversion(self):
         """writes Mode Register for continuous normal AIN(+)-AIN(-) conversion"""
-        outb = bytearray(1)
-        outb[0] = __AD7791_DATA_REG + __AD7791_READ_OP + \
-                  __AD7791_CONTINUOUS_READ + __AD7791_CHANSEL_AIN
-        self._spi.write(outb)
-        self._conversion_mode = __AD7791_CONTINUOUS
+        self._wr[0] = _AD7791_DATA_REG + _AD7791_READ_OP + \
+                      _AD7791_CONTINUOUS_READ + _AD7791_CHANSEL_AIN
+        self._select()
+        self._spi.write(self._wr1)
+        self._deselect()
+        self._conversion_mode = _AD7791_CONTINUOUS
+        self._cread_on = True
+
+    def apply_profile(self, profile):
+        """applies an acquisitionProfile in one SPI transaction, registers
+           whose cached value already matches are skipped, returns the
+           number of bytes sent"""
+        start = 0
+        if profile.filter == self._filter:
+            start = 1
+            if profile.continuous and profile.mode == self._mode:
+                start = 2
+                if self._cread_on:
+                    # already running with this setting
+                    return 0
+        if not profile.continuous and start:
+            return 0
+        if self._cread_on:
+            raise RuntimeError("stop continuous read first")
+        seq = profile.seq[start]
+        self._select()
+        self._spi.write(seq)
+        self._deselect()
+        self._filter = profile.filter
+        if profile.continuous:
+            self._mode = profile.mode
+            self._conversion_mode = _AD7791_CONTINUOUS
+            self._cread_on = True
+        return len(seq)
+
+    def stop_continuous_read(self):
+        """leaves continuous read (CREAD) mode, call while nRDY is low"""
+        # writing 0x38 (data register read without CREAD) ends continuous read
+        # mode, the pending conversion result is clocked out and discarded
+        self._rd_cmd[0] = _AD7791_DATA_REG + _AD7791_READ_OP
+        self._select()
+        self._spi.write_readinto(self._rd_cmd, self._rd_in)
+        self._deselect()
+        self._conversion_mode = _AD7791_SINGLE
+        self._cread_on = False
 
     def read_raw(self):
-        """returns raw read data"""
+        """returns raw read data as view into the shared receive buffer,
+           valid until the next transaction"""
         # skip writing to communications register when in continuous mode
-        # but write to communications register first when in single conversion mode:
-        if self._conversion_mode == __AD7791_SINGLE:
-            outb = bytearray(1)
-            outb[0] = __AD7791_DATA_REG + __AD7791_READ_OP
-            self._spi.write(outb)
-        inb = bytearray(3)
-        self._spi.readinto(inb)
-        return inb
+        # but write to communications register first when in single conversion mode,
+        # command and data then go out in one transfer:
+        _t = instrumentation.start()
+        self._select()
+        if self._conversion_mode == _AD7791_SINGLE:
+            self._rd_cmd[0] = _AD7791_DATA_REG + _AD7791_READ_OP
+            self._spi.write_readinto(self._rd_cmd, self._rd_in)
+            self._deselect()
+            instrumentation.stop(instrumentation.SPI, _t)
+            return self._data
+        self._spi.readinto(self._cread)
+        self._deselect()
+        instrumentation.stop(instrumentation.SPI, _t)
+        return self._cread
+
+    def read_code(self):
+        """returns raw read data as 24-bit integer code"""
+        inb = self.read_raw()
+        return (inb[0] << 16) | (inb[1] << 8) | inb[2]
+
+    def read_raw_into(self, buf, offset=0):
+        """copies one 3-byte sample into buf at offset"""
+        inb = self.read_raw()
+        buf[offset] = inb[0]
+        buf[offset + 1] = inb[1]
+        buf[offset + 2] = inb[2]
+
+    def bipolar(self):
+        """True when the cached mode register selects bipolar coding"""
+        return self._mode is not None and not (self._mode & _AD7791_UNIPOLAR_CODING)
+
+    def codes_to_voltage(self, codes, out=None):
+        """converts a block of codes using Vref and the cached coding"""
+        return codes_to_voltage(codes, self._ref_voltage, self.bipolar(), out)
+
+    def unipolar_voltage(self, code):
+        """converts a unipolar code to ADC voltage referred to Vref"""
+        return code/0x1000000*self._ref_voltage
+
+    def unipolar_microvolts(self, code):
+        """converts a unipolar code to integer µV referred to Vref"""
+        return code_to_microvolts(code, self._ref_uv)
     
     def read_unipolar_ADC_voltage(self):
         """returns unipolar ADC voltage referred to Vref"""
@@ -336,11 +656,11 @@ if __name__ == "__main__":
 
     print("set filter to CDIV8, 9.5sps:")
     adc.write_filter("CDIV8", "9.5sps")
-    filter = adc.read_filter()
-    adc.print_filter(filter[0])
+    adc.print_filter()
+    print("cached filter matches chip: ", adc.filter == adc.read_filter()[0])
 
     print("set coding to unipolar and start continuous conversion:")
-    adc.set_coding(__AD7791_UNIPOLAR_CODING)
+    adc.set_coding(_AD7791_UNIPOLAR_CODING)
     adc.start_continuous_conversion()
     maxtries = 1000
     for conv in range(10):
@@ -356,4 +676,75 @@ if __name__ == "__main__":
             v = adc.read_unipolar_ADC_voltage()
             print("ADC voltage: ", v )
         else:
-            print("timeout")
\ No newline at end of file
+            print("timeout")
+    while adc.nRDY.value() != 0:
+        time.sleep_ms(1)
+    adc.stop_continuous_read()
+
+    print("apply bipolar continuous profile, then the same profile again:")
+    bipolar = acquisitionProfile("CDIV1", "16.6sps", BIPOLAR_CODING, continuous=True)
+    print("bytes sent: ", adc.apply_profile(bipolar), adc.apply_profile(bipolar))
+    while adc.nRDY.value() != 0:
+        time.sleep_ms(1)
+    print("bipolar ADC voltage: ", adc.read_bipolar_ADC_voltage())
+    while adc.nRDY.value() != 0:
+        time.sleep_ms(1)
+    adc.stop_continuous_read()
+    print("cached registers match chip: ",
+          adc.mode == adc.read_mode()[0] and adc.filter == adc.read_filter()[0])
+    import gc
+    if hasattr(gc, 'mem_alloc'):
+        #the read path must not allocate, neither into the shared buffer
+        #nor into a caller's block buffer
+        raw = bytearray(30)
+        gc.collect()
+        n = 10000
+        a0 = gc.mem_alloc()
+        while n:
+            adc.read_raw()
+            n -= 1
+        a1 = gc.mem_alloc()
+        print("heap bytes allocated by 10000 read_raw(): ", a1 - a0)
+        assert a1 - a0 == 0
+        gc.collect()
+        n = 10000
+        a0 = gc.mem_alloc()
+        while n:
+            adc.read_raw_into(raw, 27)
+            n -= 1
+        a1 = gc.mem_alloc()
+        print("heap bytes allocated by 10000 read_raw_into(): ", a1 - a0)
+        assert a1 - a0 == 0
+    else:
+        #CPython with simMachine: tracemalloc peak of a warm read loop; the
+        #simulated bus allocates itself, so the reads go to a bus that does
+        #nothing and every byte traced is the driver's own; 250 loops keep
+        #the loop counter among the cached small ints
+        import tracemalloc
+        class _idleBus:
+            def readinto(self, buf, write=0x00):
+                pass
+            def write_readinto(self, out, into):
+                pass
+        def _peak(fn, n=250):
+            for _ in range(10):
+                fn()
+            tracemalloc.start()
+            a0 = tracemalloc.get_traced_memory()[0]
+            while n:
+                fn()
+                n -= 1
+            a1 = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            return a1 - a0
+        raw = bytearray(30)
+        _spi, adc._spi = adc._spi, _idleBus()
+        for mode in (_AD7791_SINGLE, _AD7791_CONTINUOUS):
+            adc._conversion_mode = mode
+            p_raw = _peak(adc.read_raw)
+            p_into = _peak(lambda: adc.read_raw_into(raw, 27))
+            print("mode: ", mode, "peak bytes, 250 read_raw(): ", p_raw, "read_raw_into(): ", p_into)
+            assert p_raw == 0
+            assert p_into == 0
+        adc._spi = _spi
+        adc._conversion_mode = _AD7791_SINGLE
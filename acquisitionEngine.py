@@ -0,0 +1,111 @@
+# MicroPython interrupt driven acquisition of AD7791 conversion results
+import AD7791.AD7791 as AD7791
+import ringBuffer
+from machine import Pin
+import time
+try:
+    from micropython import schedule
+except ImportError:
+    # CPython/simMachine: the simulated IRQ already runs outside the
+    # interrupted code, read directly
+    schedule = None
+
+# slack on top of the filter-derived wait, as in voltageSensor
+_TIMEOUT_MARGIN_US = 2000
+
+class acquisitionEngine:
+    def __init__(self, adc, size=256):
+        self.adc = adc
+        self.buffer = ringBuffer.ringBuffer(size)
+        self.running = False
+        # a read is scheduled and has not run yet; the bound method is
+        # created once, the IRQ handler must not allocate
+        self._scheduled = False
+        self._read_ref = self._read
+
+    def start(self):
+        # continuous conversions with continuous read, every falling edge of
+        # nRDY/DOUT signals a new 24-bit result
+        self.buffer.clear()
+        self.adc.set_coding(AD7791.UNIPOLAR_CODING)
+        self.adc.start_continuous_conversion()
+        self.running = True
+        self.adc.nRDY.irq(handler=self._irq, trigger=Pin.IRQ_FALLING)
+
+    def timeout_us(self):
+        # longest wait for the next result at the active filter rate: one
+        # period, plus a settling time in case the conversion restarted
+        return self.adc.period_us() + self.adc.settling_time_us() + _TIMEOUT_MARGIN_US
+
+    def abort(self):
+        # stops the IRQ without leaving continuous read, before a reset
+        self.adc.nRDY.irq(handler=None)
+        self.running = False
+
+    def stop(self):
+        # leaves continuous read at the next result, False on timeout
+        self.abort()
+        _t0 = time.ticks_us()
+        _timeout = self.timeout_us()
+        while time.ticks_diff(time.ticks_us(), _t0) < _timeout:
+            if(self.adc.nRDY.value() == 0):
+                self.adc.stop_continuous_read()
+                return True
+            time.sleep_ms(1)
+        return False
+
+    def _irq(self, pin):
+        # DOUT shares the pin with nRDY, so the SPI read must not run in the
+        # IRQ: clocking the data out toggles the pin and would re-trigger
+        # the handler. It only schedules the read; edges while a read is
+        # scheduled or running are ignored
+        if not self.running or self._scheduled:
+            return
+        self._scheduled = True
+        if schedule is None:
+            self._read(None)
+            return
+        try:
+            schedule(self._read_ref, None)
+        except RuntimeError:
+            # schedule queue full, this result is lost
+            self._scheduled = False
+            self.buffer.overruns += 1
+
+    def _read(self, _arg):
+        # runs outside the IRQ; the line is high again if the edge was a
+        # data bit or the result was already read
+        try:
+            if self.running and self.adc.nRDY.value() == 0:
+                self.buffer.put(self.adc.read_code())
+        finally:
+            self._scheduled = False
+
+    @property
+    def overruns(self):
+        return self.buffer.overruns
+
+    def get(self):
+        # returns the oldest raw code, waits up to timeout_us() for one,
+        # None on timeout
+        _code = self.buffer.get()
+        if _code is not None:
+            return _code
+        _t0 = time.ticks_us()
+        _timeout = self.timeout_us()
+        while _code is None and time.ticks_diff(time.ticks_us(), _t0) < _timeout:
+            time.sleep_ms(1)
+            _code = self.buffer.get()
+        return _code
+
+if __name__ == "__main__":
+    # Hello Acquisition Engine!
+    import voltageSensor
+    volt_sensor = voltageSensor.voltageSensor()
+    engine = acquisitionEngine(volt_sensor.adc, 64)
+    engine.start()
+    time.sleep(2)
+    print("buffered: ", len(engine.buffer), "overruns: ", engine.overruns)
+    while len(engine.buffer):
+        print(volt_sensor.adc.unipolar_voltage(engine.get()))
+    engine.stop()
@@ -0,0 +1,37 @@
+# MicroPython named AD7791 acquisition profiles, validated and encoded into
+# their SPI byte sequences once at registration, so switching between them
+# is a dictionary lookup and one bus write
+import AD7791.AD7791 as AD7791
+
+PROFILES = {}
+
+def register(name, cdiv, fadc, coding=AD7791.UNIPOLAR_CODING, continuous=False):
+    """validates and encodes a profile, ValueError for invalid settings"""
+    profile = AD7791.acquisitionProfile(cdiv, fadc, coding, continuous)
+    PROFILES[name] = profile
+    return profile
+
+def get(name):
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError("unknown profile %s" % name)
+
+def names():
+    return sorted(PROFILES)
+
+# single conversions, power-on filter setting
+DEFAULT = register('default', 'CDIV1', '16.6sps')
+# single conversions, slowest rate with lowest noise
+PRECISE = register('precise', 'CDIV1', '9.5sps')
+# unipolar continuous conversions at the fastest rate, used for bursts
+FAST = register('fast', 'CDIV1', '120sps', continuous=True)
+# bipolar continuous conversions, 50/60 Hz rejection
+BIPOLAR = register('bipolar', 'CDIV1', '16.6sps', coding=AD7791.BIPOLAR_CODING,
+                   continuous=True)
+
+if __name__ == "__main__":
+    # Hello Profiles!
+    for name in names():
+        p = get(name)
+        print(name, p, "%.1f sps" % p.update_rate, "bytes:", bytes(p.seq[0]).hex())
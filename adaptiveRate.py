@@ -0,0 +1,71 @@
+# MicroPython adaptive AD7791 update rate: fast while the RF level changes,
+# slow with high 50/60 Hz rejection once the signal is stable
+
+class adaptiveRate:
+    def __init__(self, adc, fast=("CDIV1", "120sps"), slow=("CDIV1", "16.6sps"),
+                 rise=20000.0, fall=5000.0, hold=8, weight=4):
+        """
+        Create adaptive update rate control
+
+        Args:
+            adc: AD7791 instance
+            fast, slow: (cdiv, fadc) arguments for AD7791.write_filter()
+            rise: variance of sample-to-sample code differences above
+                  which the fast rate is selected
+            fall: variance below which the slow rate is selected again
+                  after hold consecutive quiet samples
+            weight: averaging length of the variance estimate
+        """
+        self.adc = adc
+        self.fast = fast
+        self.slow = slow
+        self.rise = rise
+        self.fall = fall
+        self.hold = hold
+        self.weight = weight
+        self.isFast = False
+        self.switches = 0
+        self.variance = 0.0
+        self._last = None
+        self._quiet = 0
+        self._discard = 0
+
+    def start(self):
+        self.variance = 0.0
+        self._select(self.slow, False)
+
+    def _select(self, setting, fast):
+        self.adc.write_filter(setting[0], setting[1])
+        self.isFast = fast
+        self._last = None
+        self._quiet = 0
+        # the first result after a rate change has not settled yet
+        self._discard = 1
+
+    @property
+    def settling_time_ms(self):
+        return self.adc.settling_time_ms()
+
+    def process(self, code):
+        """feeds a new code, returns False if it has to be discarded"""
+        if self._discard:
+            self._discard -= 1
+            return False
+        _last = self._last
+        self._last = code
+        if _last is None:
+            return True
+        _d = float(code - _last)
+        self.variance += (_d * _d - self.variance) / self.weight
+        if not self.isFast:
+            if self.variance > self.rise:
+                self.switches += 1
+                self._select(self.fast, True)
+        elif self.variance < self.fall:
+            self._quiet += 1
+            if self._quiet >= self.hold:
+                self.switches += 1
+                self._select(self.slow, False)
+        else:
+            self._quiet = 0
+        return True
@@ -0,0 +1,152 @@
+# uasyncio/asyncio acquisition core for the rfDiodeSensor
+# the AD7415 temperature read runs while the AD7791 conversion is pending,
+# waiting for nRDY yields to other tasks instead of blocking
+import time
+import rfDiodeSensor
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+# uasyncio has sleep_ms, CPython asyncio only sleep in seconds
+try:
+    _sleep_ms = asyncio.sleep_ms
+except AttributeError:
+    def _sleep_ms(ms):
+        return asyncio.sleep(ms / 1000)
+
+class asyncAcquisition:
+    def __init__(self, rfDiodeSensor):
+        self.rfDiodeSensor = rfDiodeSensor
+        self.running = False
+        self._resume = asyncio.Event()
+        self._resume.set()
+
+    @property
+    def paused(self):
+        return not self._resume.is_set()
+
+    def pause(self):
+        self._resume.clear()
+
+    def resume(self):
+        self._resume.set()
+
+    def stop(self):
+        self.running = False
+        self._resume.set()
+
+    async def waitReady(self):
+        #sleeps through the predicted conversion time, then polls nRDY in
+        #1ms steps until the settling-time derived timeout, other tasks
+        #run in between
+        vsensor = self.rfDiodeSensor.voltageSensor
+        _left = vsensor.remainingUs()
+        if _left > 0:
+            await asyncio.sleep(_left / 1000000)
+        else:
+            vsensor.catchUp(_left)
+        while not vsensor.adc.ready():
+            if vsensor.expired():
+                vsensor.flagTimeout()
+                return False
+            await _sleep_ms(1)
+        return True
+
+    async def getBuffered(self):
+        #oldest code of the running acquisition engine, polls the ring
+        #buffer in 1ms steps instead of blocking in engine.get(); times out
+        #and resets like voltageSensor.readCode()
+        vsensor = self.rfDiodeSensor.voltageSensor
+        engine = vsensor.engine
+        _t0 = time.ticks_us()
+        _timeout = engine.timeout_us()
+        _code = engine.buffer.get()
+        while _code is None:
+            if time.ticks_diff(time.ticks_us(), _t0) >= _timeout:
+                vsensor.flagTimeout()
+                vsensor.recover()
+                return None
+            await _sleep_ms(1)
+            _code = engine.buffer.get()
+        if vsensor.offset is None:
+            return _code
+        return vsensor.offset.correct(_code)
+
+    async def readCode(self):
+        # raw, filtered ADC code, None on timeout
+        rfds = self.rfDiodeSensor
+        vsensor = rfds.voltageSensor
+        while True:
+            if vsensor.engine is not None and vsensor.engine.running:
+                code = await self.getBuffered()
+            else:
+                rfds.startConversion()
+                if not await self.waitReady():
+                    vsensor.recover()
+                    return None
+                # None after a zero conversion or a result discarded by
+                # adaptive mode, the next conversion is already running
+                code = vsensor.pollCode()
+                if code is None:
+                    continue
+            if code is None or rfds.filter is None:
+                return code
+            code = rfds.filter.process(code)
+            if code is not None:
+                return code
+
+    async def snapshot(self):
+        # like rfDiodeSensor.snapshot(), latency is max(conversion, I2C)
+        # instead of their sum
+        rfds = self.rfDiodeSensor
+        rfds.startConversion()
+        rfds.cachedTemperature()
+        return rfds.makeSample(await self.readCode())
+
+    async def run(self, callback, count=None, period_ms=0):
+        """
+        Acquire snapshots until stop() or count samples
+
+        Args:
+            callback: called with every sample
+            count: number of samples, None runs until stop()
+            period_ms: minimum sample period, 0 for as fast as possible
+        """
+        self.running = True
+        _n = 0
+        _next = time.ticks_ms()
+        try:
+            while self.running and (count is None or _n < count):
+                if self.paused:
+                    await self._resume.wait()
+                    # restart the schedule, no catch-up burst after a pause
+                    _next = time.ticks_ms()
+                if not self.running:
+                    break
+                if period_ms:
+                    _now = time.ticks_ms()
+                    _wait = time.ticks_diff(_next, _now)
+                    if _wait > 0:
+                        await _sleep_ms(_wait)
+                    elif -_wait > period_ms:
+                        # more than a period late, resync instead of
+                        # firing samples back to back until caught up
+                        _next = _now
+                    _next = time.ticks_add(_next, period_ms)
+                callback(await self.snapshot())
+                _n += 1
+                # give command handling a chance even at full speed
+                await asyncio.sleep(0)
+        finally:
+            self.running = False
+        return _n
+
+if __name__ == "__main__":
+    # Hello Async Acquisition!
+    import voltageSensor
+    import temperatureSensor
+    vsensor = voltageSensor.voltageSensor()
+    tsensor = temperatureSensor.temperatureSensor()
+    acq = asyncAcquisition(rfDiodeSensor.rfDiodeSensor(vsensor, tsensor))
+    asyncio.run(acq.run(print, 10))
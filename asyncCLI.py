@@ -0,0 +1,107 @@
+# uasyncio/asyncio variant of the CLI: commands are read while a stream is running
+import sys
+import cli
+import asyncAcquisition
+try:
+	import uasyncio as asyncio
+except ImportError:
+	import asyncio
+
+# commands that use the ADC or the I2C bus themselves, they would take the
+# stream's pending conversion, so they are refused while it runs
+STREAM_EXCLUDED = ('v', 't', 'p', 'a', 'l', 'b', 'c', 'u', 'g', 'r', 'z')
+
+class asyncCLI(cli.CLI):
+	def __init__(self, rfDiodeSensor):
+		super().__init__(rfDiodeSensor)
+		self.acquisition = asyncAcquisition.asyncAcquisition(rfDiodeSensor)
+		self.commands['s'] = self.cmd_stream
+		self.commands['stop'] = self.cmd_stop
+		self.commands['pause'] = self.cmd_pause
+		self.commands['resume'] = self.cmd_resume
+		self._index = 0
+		# reference to the stream task, an unreferenced task may be
+		# garbage collected on CPython
+		self._task = None
+
+	def streaming(self):
+		# after stop the task may still finish its current sample
+		return self.acquisition.running or (self._task is not None and not self._task.done())
+
+	def dispatch(self, cmd, args):
+		if cmd in STREAM_EXCLUDED and self.streaming():
+			raise RuntimeError('Stream running, stop it first')
+		super().dispatch(cmd, args)
+
+	def cmd_help(self, args):
+		super().cmd_help(args)
+		print('              s <count> [period ms] (background stream), stop,')
+		print('              pause, resume')
+
+	def _print_sample(self, s):
+		print('index: %d voltage: %f temperature: %.2f power: %f' % (
+			self._index, s.voltage, s.temperature, s.power))
+		self._index += 1
+
+	def cmd_stream(self, args):
+		if self.streaming():
+			raise RuntimeError('Stream already running')
+		count = int(args[0]) if args else None
+		period_ms = int(args[1]) if len(args) > 1 else cli.RATE_LIMIT_MS
+		self._index = 0
+		self._task = asyncio.create_task(self.acquisition.run(self._print_sample, count, period_ms))
+		print('OK: Stream started')
+
+	def cmd_stop(self, args):
+		self.acquisition.stop()
+		print('OK: Stream stopped')
+
+	def cmd_pause(self, args):
+		self.acquisition.pause()
+		print('OK: Paused')
+
+	def cmd_resume(self, args):
+		self.acquisition.resume()
+		print('OK: Resumed')
+
+	async def _readline(self):
+		if sys.implementation.name == 'micropython':
+			if not hasattr(self, '_reader'):
+				self._reader = asyncio.StreamReader(sys.stdin)
+			line = await self._reader.readline()
+			return line.decode() if isinstance(line, bytes) else line
+		# CPython: blocking readline in a worker thread
+		return await asyncio.get_event_loop().run_in_executor(None, sys.stdin.readline)
+
+	async def run_async(self):
+		print('RF Power Sensor CLI. Type ? for commands.')
+		while self.running:
+			try:
+				line = await self._readline()
+				if not line:
+					self.running = False
+					break
+				line = line.strip()
+				if not line:
+					continue
+				self.add_history(line)
+				self.execute(line)
+			except KeyboardInterrupt:
+				print('\nInterrupted')
+			except Exception as e:
+				print('ERR:', e)
+		self.acquisition.stop()
+
+	def run(self):
+		asyncio.run(self.run_async())
+
+if __name__ == '__main__':
+	import rfDiodeSensor
+	import voltageSensor
+	import temperatureSensor
+
+	vsensor=voltageSensor.voltageSensor()
+	tsensor=temperatureSensor.temperatureSensor()
+	rfds = rfDiodeSensor.rfDiodeSensor(vsensor, tsensor)
+
+	asyncCLI(rfds).run()
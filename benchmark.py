@@ -0,0 +1,144 @@
+# Benchmark of the acquisition paths: samples/second, per-sample latency and
+# heap allocations (harness overhead subtracted). Runs on the device or on
+# CPython with simulated hardware:
+#   python benchmark.py [samples] [cdiv fadc]
+import sys
+import time
+try:
+    import machine
+except ImportError:
+    import simMachine
+    simMachine.install()
+import gc
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+# CPython: tracemalloc peak during the timed section, objects freed again
+# are included only while alive; MicroPython: total heap allocated, the GC
+# is disabled meanwhile. The harness's own share, measured once with a
+# no-op, is subtracted from every result.
+ALLOC_LABEL = 'alloc_peak_bytes' if tracemalloc is not None else 'alloc_bytes'
+_overhead = {'iter': 0, 'call': 0}
+
+def _alloc_start():
+    gc.collect()
+    if tracemalloc is not None:
+        tracemalloc.start()
+        return 0
+    gc.disable()
+    return gc.mem_alloc()
+
+def _alloc_end(start):
+    if tracemalloc is not None:
+        _current, _peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return _peak
+    _alloc = gc.mem_alloc() - start
+    gc.enable()
+    return _alloc
+
+def report(name, n, total_us, lat_max_us, alloc):
+    print('bench: %s n: %d sps: %.1f lat_mean_ms: %.3f lat_max_ms: %.3f %s: %d' % (
+        name, n, n * 1e6 / total_us if total_us else 0.0,
+        total_us / n / 1000 if n else 0.0, lat_max_us / 1000, ALLOC_LABEL, alloc))
+
+def _time_iter(samples):
+    _n = 0
+    _lat_max = 0
+    _a0 = _alloc_start()
+    _t0 = time.ticks_us()
+    _last = _t0
+    for _s in samples:
+        _now = time.ticks_us()
+        _lat = time.ticks_diff(_now, _last)
+        if _lat > _lat_max:
+            _lat_max = _lat
+        _last = _now
+        _n += 1
+    _total = time.ticks_diff(_last, _t0)
+    return _n, _total, _lat_max, _alloc_end(_a0)
+
+def _time_call(fn):
+    _a0 = _alloc_start()
+    _t0 = time.ticks_us()
+    fn()
+    _total = time.ticks_diff(time.ticks_us(), _t0)
+    return _total, _alloc_end(_a0)
+
+def _noop():
+    return None
+
+def calibrate(n):
+    """measures the harness allocations with a no-op"""
+    _overhead['iter'] = _time_iter(_repeat(_noop, n))[3]
+    _overhead['call'] = _time_call(_noop)[1]
+
+def bench_iter(name, samples):
+    """times an iterator that produces one item per sample"""
+    _n, _total, _lat_max, _alloc = _time_iter(samples)
+    report(name, _n, _total, _lat_max, max(0, _alloc - _overhead['iter']))
+
+def bench_call(name, n, fn):
+    """times a single call that produces n samples"""
+    _total, _alloc = _time_call(fn)
+    report(name, n, _total, _total, max(0, _alloc - _overhead['call']))
+
+def _repeat(fn, n):
+    for _i in range(n):
+        yield fn()
+
+def _make_float(rfds, codes):
+    # per-sample float path from a code: V, cached °C, power, sample record
+    for _i in range(len(codes)):
+        rfds.makeSample(codes[_i])
+
+def _make_fixed(rfds, codes, fixed):
+    # the same with µV, 1/4 °C and integer power into a preallocated array
+    for _i in range(len(codes)):
+        rfds.makeFixed(codes[_i], fixed)
+
+def run(n=30, rate=("CDIV1", "16.6sps")):
+    import voltageSensor
+    import temperatureSensor
+    import rfDiodeSensor
+    from array import array
+    vsensor = voltageSensor.voltageSensor()
+    tsensor = temperatureSensor.temperatureSensor()
+    vsensor.setRate(rate[0], rate[1])
+    print('bench: rate %s %s, %.1f sps' % (rate[0], rate[1], vsensor.adc.update_rate))
+    calibrate(n)
+    print('bench: harness %s iter: %d call: %d (subtracted)' % (
+        ALLOC_LABEL, _overhead['iter'], _overhead['call']))
+    bench_iter('single', _repeat(vsensor.readVoltage, n))
+    bench_iter('continuous', vsensor.stream(n))
+    raw = bytearray(3 * n)
+    codes = array('l', [0] * n)
+    out = array('f', [0.0] * n)
+    bench_call('block', n, lambda: vsensor.readBlock(n, raw, codes, out))
+    bench_call('burst', n, lambda: vsensor.readBurst(n, raw, codes, out))
+    bench_iter('raw_read', _repeat(vsensor.adc.read_code, 10 * n))
+    bench_call('convert', n, lambda: vsensor.adc.codes_to_voltage(codes, out))
+    bench_iter('temperature', _repeat(tsensor.readTemperature, n))
+    # float vs fixed-point path from code to power, make_* without the ADC
+    # read so that only the conversion's own allocations are counted,
+    # sample_* with it; the fixed path targets integer-only ports: on
+    # CPython ints are heap objects too and floats are native, so it is
+    # slower there and allocates as well, on MicroPython make_fixed must
+    # allocate nothing; equivalence is checked by fixedPointCheck.py
+    rfds = rfDiodeSensor.rfDiodeSensor(vsensor, tsensor)
+    fixed = array('l', [0, 0, 0, 0])
+    for _i in range(n):
+        codes[_i] = (_i * 0x8b3a7) & 0xffffff
+    rfds.cachedTemperature()
+    rfds.cachedQuarters()
+    bench_call('make_float', n, lambda: _make_float(rfds, codes))
+    bench_call('make_fixed', n, lambda: _make_fixed(rfds, codes, fixed))
+    bench_iter('sample_float', _repeat(rfds.snapshot, n))
+    bench_iter('sample_fixed', _repeat(lambda: rfds.measureFixed(fixed), n))
+
+if __name__ == "__main__":
+    _n = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    _rate = (sys.argv[2], sys.argv[3]) if len(sys.argv) > 3 else ("CDIV1", "16.6sps")
+    run(_n, _rate)
@@ -0,0 +1,112 @@
+# Fixed-size little-endian measurement frames for binary streaming,
+# frameEncoder runs on the device, frameDecoder on the host
+#
+# offset size field
+#      0    2 sync word 0x5aa5
+#      2    2 sequence number, wraps at 65536
+#      4    4 time.ticks_ms() timestamp
+#      8    4 raw AD7791 code (24 bit), 0xffffffff on conversion timeout
+#     12    2 raw AD7415 temperature register
+#     14    2 CRC-16/CCITT-FALSE of bytes 0..13
+import struct
+from array import array
+
+FRAME_FORMAT = '<HHIIHH'
+FRAME_SIZE = 16
+FRAME_SYNC = 0x5aa5
+_SYNC_BYTES = b'\xa5\x5a'
+
+def _make_crc_table():
+    table = array('H', [0] * 256)
+    for i in range(256):
+        crc = i << 8
+        for _b in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else (crc << 1)
+        table[i] = crc & 0xffff
+    return table
+
+_crc_table = _make_crc_table()
+
+def crc16(buf, n, offset=0):
+    """CRC-16/CCITT-FALSE of n bytes of buf starting at offset"""
+    crc = 0xffff
+    for i in range(offset, offset + n):
+        crc = ((crc << 8) & 0xff00) ^ _crc_table[(crc >> 8) ^ buf[i]]
+    return crc
+
+class frameEncoder:
+    def __init__(self):
+        self._buf = bytearray(FRAME_SIZE)
+        self.seq = 0
+
+    def encode(self, ticks, adc_code, temp_code):
+        """packs one frame into the shared buffer and returns it"""
+        self.encode_into(self._buf, 0, ticks, adc_code, temp_code)
+        return self._buf
+
+    def encode_into(self, buf, offset, ticks, adc_code, temp_code):
+        """packs one frame into buf at offset, e.g. straight into a log buffer"""
+        struct.pack_into(FRAME_FORMAT, buf, offset, FRAME_SYNC, self.seq,
+                         ticks & 0xffffffff, adc_code & 0xffffffff,
+                         temp_code & 0xffff, 0)
+        _crc = crc16(buf, FRAME_SIZE - 2, offset)
+        buf[offset + FRAME_SIZE - 2] = _crc & 0xff
+        buf[offset + FRAME_SIZE - 1] = _crc >> 8
+        self.seq = (self.seq + 1) & 0xffff
+
+class frameDecoder:
+    def __init__(self):
+        self._pending = b''
+        self._next_seq = None
+        self.frames = 0
+        self.crc_errors = 0
+        self.lost = 0
+
+    def feed(self, data):
+        """
+        Decode a chunk of the byte stream
+
+        Returns a list of (seq, ticks, adc_code, temp_code) tuples, an
+        incomplete frame at the end is kept for the next call. Garbage
+        and frames with a bad CRC are skipped by searching for the
+        next sync word.
+        """
+        buf = self._pending + bytes(data)
+        out = []
+        pos = 0
+        end = len(buf)
+        while end - pos >= FRAME_SIZE:
+            if buf[pos:pos + 2] != _SYNC_BYTES:
+                nxt = buf.find(_SYNC_BYTES, pos + 1)
+                pos = nxt if nxt >= 0 else end - 1
+                continue
+            _sync, seq, ticks, code, temp, crc = \
+                struct.unpack_from(FRAME_FORMAT, buf, pos)
+            if crc16(memoryview(buf)[pos:], FRAME_SIZE - 2) != crc:
+                self.crc_errors += 1
+                pos += 1
+                continue
+            if self._next_seq is not None:
+                self.lost += (seq - self._next_seq) & 0xffff
+            self._next_seq = (seq + 1) & 0xffff
+            self.frames += 1
+            out.append((seq, ticks, code, temp))
+            pos += FRAME_SIZE
+        self._pending = buf[pos:]
+        return out
+
+def decode(data):
+    """decodes a complete capture, returns the list of frame tuples"""
+    return frameDecoder().feed(data)
+
+if __name__ == "__main__":
+    # Hello Frames!
+    enc = frameEncoder()
+    stream = b'garbage'
+    for i in range(5):
+        stream += bytes(enc.encode(1000 + 10 * i, 0x123456 + i, 0x1900))
+    dec = frameDecoder()
+    frames = dec.feed(stream[:30]) + dec.feed(stream[30:])
+    for f in frames:
+        print(f)
+    print("frames: ", dec.frames, "crc errors: ", dec.crc_errors, "lost: ", dec.lost)
@@ -0,0 +1,95 @@
+# MicroPython burst capture for pulsed and modulated signals: n samples at
+# the fastest AD7791 update rate into preallocated buffers, reduced on the
+# device to min/max/mean/RMS power and the crest factor
+import math
+import time
+from array import array
+try:
+    from collections import namedtuple
+except ImportError:
+    from ucollections import namedtuple
+
+# power statistics of one burst, linear power (mW with a calibration table),
+# crest factor = max / rms
+burstStats = namedtuple('burstStats', ('n', 'sps', 'temperature', 'min', 'max',
+                                       'mean', 'rms', 'crest'))
+
+class burstCapture:
+    def __init__(self, rfDiodeSensor, size=256):
+        """
+        Create burst capture
+
+        Args:
+            rfDiodeSensor: sensor head to capture from
+            size: maximum number of samples per burst, all buffers are
+                  allocated here
+        """
+        self.rfDiodeSensor = rfDiodeSensor
+        self.size = size
+        self.raw = bytearray(3 * size)
+        self.codes = array('l', [0] * size)
+        self.voltages = array('f', [0.0] * size)
+        self.powers = array('f', [0.0] * size)
+        # samples in the buffers from the last capture()
+        self.count = 0
+
+    def _power(self, voltage, temperature):
+        # statistics need linear power, the calibration table works in dBm
+        cal = self.rfDiodeSensor.calibration
+        if cal is not None:
+            return cal.mw(voltage, temperature)
+        return self.rfDiodeSensor.power(voltage, temperature)
+
+    def capture(self, n=None):
+        """captures n samples (default: size), returns burstStats or None
+           if no sample arrived"""
+        if n is None:
+            n = self.size
+        if n < 1 or n > self.size:
+            raise ValueError("burst length must be 1..%d" % self.size)
+        rfds = self.rfDiodeSensor
+        # one temperature for the whole burst, no I2C traffic during the capture
+        temperature = rfds.cachedTemperature()
+        vsensor = rfds.voltageSensor
+        _t0 = time.ticks_ms()
+        vsensor.readBurst(n, self.raw, self.codes, self.voltages)
+        _ms = time.ticks_diff(time.ticks_ms(), _t0)
+        _n = vsensor.blockCount
+        self.count = _n
+        if not _n:
+            return None
+        _min = _max = self._power(self.voltages[0], temperature)
+        _sum = 0.0
+        _sq = 0.0
+        for _i in range(_n):
+            _p = self._power(self.voltages[_i], temperature)
+            self.powers[_i] = _p
+            if _p < _min:
+                _min = _p
+            elif _p > _max:
+                _max = _p
+            _sum += _p
+            _sq += _p * _p
+        _rms = math.sqrt(_sq / _n)
+        return burstStats(_n, _n * 1000.0 / _ms if _ms else 0.0, temperature,
+                          _min, _max, _sum / _n, _rms,
+                          _max / _rms if _rms else 0.0)
+
+if __name__ == "__main__":
+    # Hello Burst!
+    import voltageSensor
+    import temperatureSensor
+    import rfDiodeSensor
+    vsensor = voltageSensor.voltageSensor()
+    tsensor = temperatureSensor.temperatureSensor()
+    rfds = rfDiodeSensor.rfDiodeSensor(vsensor, tsensor)
+    burst = burstCapture(rfds, 120)
+    s = burst.capture()
+    print(s)
+    # the statistics must match a straight recomputation from the buffer
+    p = burst.powers[:burst.count]
+    mean = sum(p) / len(p)
+    assert abs(s.mean - mean) <= 1e-6 * abs(mean) + 1e-9
+    assert abs(s.min - min(p)) <= 1e-6 and abs(s.max - max(p)) <= 1e-6
+    assert s.min <= s.mean <= s.rms <= s.max
+    print("update rate after burst: ", vsensor.adc.update_rate)
@@ -0,0 +1,164 @@
+# MicroPython calibration table for the detector diode: voltage x temperature -> power
+from array import array
+
+class calibrationTable:
+    def __init__(self, voltages, temperatures, dbm):
+        """
+        Create calibration table
+
+        Args:
+            voltages: ascending detector voltages (rows)
+            temperatures: ascending sensor temperatures in °C (columns)
+            dbm: power in dBm, one row of len(temperatures) values per voltage
+        """
+        self._nv = len(voltages)
+        self._nt = len(temperatures)
+        if self._nv < 2 or self._nt < 2:
+            raise ValueError("table needs at least 2 voltages and 2 temperatures")
+        self._v = array('f', voltages)
+        self._t = array('f', temperatures)
+        # bilinear coefficients per cell, p = a + b*dv + c*dt + d*dv*dt
+        # with dv, dt relative to the lower cell corner
+        _ncells = (self._nv - 1) * (self._nt - 1)
+        self._a = array('f', bytearray(4 * _ncells))
+        self._b = array('f', bytearray(4 * _ncells))
+        self._c = array('f', bytearray(4 * _ncells))
+        self._d = array('f', bytearray(4 * _ncells))
+        for i in range(self._nv - 1):
+            _hv = self._v[i + 1] - self._v[i]
+            for j in range(self._nt - 1):
+                _ht = self._t[j + 1] - self._t[j]
+                _p00 = dbm[i][j]
+                _p01 = dbm[i][j + 1]
+                _p10 = dbm[i + 1][j]
+                _p11 = dbm[i + 1][j + 1]
+                _k = i * (self._nt - 1) + j
+                self._a[_k] = _p00
+                self._b[_k] = (_p10 - _p00) / _hv
+                self._c[_k] = (_p01 - _p00) / _ht
+                self._d[_k] = (_p11 - _p10 - _p01 + _p00) / (_hv * _ht)
+
+    @staticmethod
+    def _clamp(axis, n, x):
+        # values outside the table are clamped to its edges, extrapolating
+        # the diode curve would invent power readings; NaN passes through
+        if x < axis[0]:
+            return axis[0]
+        if x > axis[n - 1]:
+            return axis[n - 1]
+        return x
+
+    @staticmethod
+    def _cell(axis, n, x):
+        # bisect for the lower cell index
+        _lo = 0
+        _hi = n - 1
+        while _hi - _lo > 1:
+            _mid = (_lo + _hi) >> 1
+            if x < axis[_mid]:
+                _hi = _mid
+            else:
+                _lo = _mid
+        return _lo
+
+    def dbm(self, voltage, temperature):
+        """returns interpolated power in dBm, clamped to the table range"""
+        voltage = self._clamp(self._v, self._nv, voltage)
+        temperature = self._clamp(self._t, self._nt, temperature)
+        i = self._cell(self._v, self._nv, voltage)
+        j = self._cell(self._t, self._nt, temperature)
+        _k = i * (self._nt - 1) + j
+        _dv = voltage - self._v[i]
+        _dt = temperature - self._t[j]
+        return self._a[_k] + self._b[_k] * _dv + \
+               (self._c[_k] + self._d[_k] * _dv) * _dt
+
+    def mw(self, voltage, temperature):
+        """returns interpolated power in mW"""
+        return 10 ** (self.dbm(voltage, temperature) / 10)
+
+    def convert(self, voltages, temperature, out):
+        """converts a block of voltages taken at one temperature to dBm into
+           the preallocated out array, returns out"""
+        temperature = self._clamp(self._t, self._nt, temperature)
+        j = self._cell(self._t, self._nt, temperature)
+        _dt = temperature - self._t[j]
+        for n in range(len(voltages)):
+            _v = self._clamp(self._v, self._nv, voltages[n])
+            i = self._cell(self._v, self._nv, _v)
+            _k = i * (self._nt - 1) + j
+            _dv = _v - self._v[i]
+            out[n] = self._a[_k] + self._b[_k] * _dv + \
+                     (self._c[_k] + self._d[_k] * _dv) * _dt
+        return out
+
+def load(filename):
+    """
+    Load a calibration table from a text file
+
+    First line: temperatures in °C, following lines: voltage and
+    the power in dBm for each temperature, separated by commas.
+    Lines starting with # are ignored.
+    """
+    temperatures = None
+    voltages = []
+    dbm = []
+    with open(filename) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line[0] == '#':
+                continue
+            values = [float(x) for x in line.split(',')]
+            if temperatures is None:
+                temperatures = values
+            else:
+                voltages.append(values[0])
+                dbm.append(values[1:])
+    return calibrationTable(voltages, temperatures, dbm)
+
+if __name__ == "__main__":
+    # Hello Calibration Table! checks with small synthetic tables
+    # power linear in voltage and temperature, so the bilinear
+    # interpolation has to reproduce it exactly inside the table
+    def _p(v, t):
+        return -50.0 + 40.0 * v + 0.02 * (t - 25)
+    def _close(a, b):
+        return abs(a - b) < 1e-4
+    volts = [0.0, 0.1, 0.5, 1.0, 2.5]
+    temps = [-20.0, 0.0, 25.0, 60.0]
+    cal = calibrationTable(volts, temps, [[_p(v, t) for t in temps] for v in volts])
+    for v, t in ((0.05, 25.0), (0.3, -10.0), (1.7, 40.0), (2.5, 60.0)):
+        print("v: ", v, "t: ", t, "dBm: ", cal.dbm(v, t), "expected: ", _p(v, t))
+        assert _close(cal.dbm(v, t), _p(v, t))
+    # exact values at every table point
+    for v in volts:
+        for t in temps:
+            assert _close(cal.dbm(v, t), _p(v, t))
+    # 2x2 table with a cross term: the cell midpoint is the mean of the
+    # corners, edge midpoints the mean of their two corners
+    sq = calibrationTable([0.0, 1.0], [0.0, 50.0], [[-40.0, -42.0], [-10.0, -20.0]])
+    assert _close(sq.dbm(0.5, 25.0), (-40.0 - 42.0 - 10.0 - 20.0) / 4)
+    assert _close(sq.dbm(0.5, 0.0), -25.0)
+    assert _close(sq.dbm(1.0, 25.0), -15.0)
+    # clamping at both ends of both axes
+    assert _close(cal.dbm(-1.0, 25.0), _p(0.0, 25.0))
+    assert _close(cal.dbm(3.0, 25.0), _p(2.5, 25.0))
+    assert _close(cal.dbm(1.0, -40.0), _p(1.0, -20.0))
+    assert _close(cal.dbm(1.0, 85.0), _p(1.0, 60.0))
+    assert _close(cal.dbm(9.0, 99.0), _p(2.5, 60.0))
+    # temperature compensation follows the sign of the table's temperature
+    # slope (rising in cal, falling in sq), power rises with voltage
+    assert cal.dbm(0.3, 50.0) > cal.dbm(0.3, 10.0)
+    assert sq.dbm(0.5, 40.0) < sq.dbm(0.5, 10.0)
+    assert cal.dbm(0.6, 25.0) > cal.dbm(0.4, 25.0)
+    assert _close(cal.mw(0.5, 25.0), 10 ** (_p(0.5, 25.0) / 10))
+    # the block conversion agrees with single evaluations, clamping included
+    block = array('f', [-0.5, 0.0, 0.25, 0.75, 2.0, 4.0])
+    out = cal.convert(block, 25.0, array('f', bytearray(4 * len(block))))
+    print("block dBm: ", list(out))
+    for n in range(len(block)):
+        assert _close(out[n], cal.dbm(block[n], 25.0))
+    # NaN (conversion timeout) stays NaN
+    v = cal.dbm(float('nan'), 25.0)
+    assert v != v
+    print("calibration checks passed")
@@ -2,6 +2,14 @@
 import sys
 import time
 import rfDiodeSensor
+import sampleFilters
+import binaryFrame
+import deadlineScheduler
+import instrumentation
+import burstCapture
+import flashLogger
+import offsetTracker
+import reportTrigger
 
 try:
 	import uos as os
@@ -11,6 +19,16 @@ except ImportError:
 HISTORY_SIZE = 10
 RATE_LIMIT_MS = 200  # milliseconds between outputs
 
+# Batch lines: commands separated by ';', each optionally tagged '<id>:',
+# e.g. '1:v; 2:t; 3:p; 4:r'. The responses form one block:
+#   @BEGIN <n>
+#   <output of the first command>, readings as key=value, e.g. voltage=0.5
+#   @<id> OK            or  @<id> ERR: <message>
+#   ...
+#   @END
+BATCH_SEPARATOR = ';'
+BATCH_EXCLUDED = ('b', 'x')  # binary output or no prompt afterwards
+
 class CLI:
 	def __init__(self, rfDiodeSensor):
 		self.rfDiodeSensor = rfDiodeSensor
@@ -21,12 +39,26 @@ class CLI:
 			'p': self.cmd_readP,
 			'a': self.cmd_readAll,
 			'l': self.cmd_loop,
+			'b': self.cmd_binaryLoop,
+			'c': self.cmd_capture,
+			'u': self.cmd_burst,
+			'g': self.cmd_log,
+			'd': self.cmd_logs,
+			'f': self.cmd_filter,
+			'r': self.cmd_rate,
+			'z': self.cmd_offset,
+			'e': self.cmd_trigger,
+			'i': self.cmd_instrumentation,
 			'x': self.cmd_exit,
 		}
 		self.running = True
 		self.history = []
 		self.history_index = None
 		self.paused = False
+		self.capturing = False
+		self.burst = None
+		self.trigger = None
+		self.batch = False
 
 	def run(self):
 		print('RF Power Sensor CLI. Type ? for commands.')
@@ -36,16 +68,54 @@ class CLI:
 				if not line:
 					continue
 				self.add_history(line)
-				cmd, *args = line.strip().split()
-				if cmd in self.commands:
-					self.commands[cmd](args)
-				else:
-					print('ERR: Unknown command')
+				self.execute(line)
 			except KeyboardInterrupt:
 				print('\nInterrupted')
 			except Exception as e:
 				print('ERR:', e)
 
+	def execute(self, line):
+		# one command, or a batch when the line contains the separator
+		if BATCH_SEPARATOR in line:
+			self.run_batch(line)
+			return
+		cmd, *args = line.strip().split()
+		self.dispatch(cmd, args)
+
+	def dispatch(self, cmd, args):
+		if cmd not in self.commands:
+			raise ValueError('Unknown command')
+		self.commands[cmd](args)
+
+	def run_batch(self, line):
+		parts = [p.strip() for p in line.split(BATCH_SEPARATOR)]
+		parts = [p for p in parts if p]
+		print('@BEGIN %d' % len(parts))
+		self.batch = True
+		try:
+			for n in range(len(parts)):
+				part = parts[n]
+				rid = str(n + 1)
+				i = part.find(':')
+				if i > 0 and ' ' not in part[:i]:
+					rid = part[:i]
+					part = part[i + 1:]
+				try:
+					words = part.split()
+					if not words:
+						raise ValueError('Empty command')
+					cmd, args = words[0], words[1:]
+					# 'd <file>' dumps binary data
+					if cmd in BATCH_EXCLUDED or (cmd == 'd' and args and args[0] != 'rm'):
+						raise ValueError('Not allowed in batch')
+					self.dispatch(cmd, args)
+					print('@%s OK' % rid)
+				except Exception as e:
+					print('@%s ERR: %s' % (rid, e))
+		finally:
+			self.batch = False
+		print('@END')
+
 	def input_with_history(self, prompt):
 		# Basic input with history navigation using up/down arrows
 		# MicroPython REPL does not support arrow keys natively, so this is a stub for real hardware integration
@@ -60,46 +130,300 @@ class CLI:
 
 	def cmd_help(self, args):
 		print('OK: Commands: ? (help),       v (read voltage), t (read temperature),')
-		print('              p (read power), a (read all),     l <count> (loop),')
+		print('              p (read power), a (read all),     l <count> [period ms] (loop),')
+		print('              e [lo <p>] [hi <p>] [hyst <p>] [delta <p>] [hb <ms>] | off')
+		print('                (loop reports by exception, l 0 runs until Ctrl-C, period 0 at ADC rate),')
+		print('              b <count> (binary frame loop),')
+		print('              c <size> (start buffered capture, 0 stops),')
+		print('              u <count> [raw] (burst at 120 sps, statistics),')
+		print('              g <count> [period ms] (log to flash, 0 runs until Ctrl-C),')
+		print('              d [<file> | rm <file> | rm all] (list, dump, remove logs),')
+		print('              f [avg <n>] [ema <shift>] [dec <n>] [stats] | off (filter),')
+		print('              r [auto | <profile> | <cdiv> <rate>] (ADC update rate),')
+		print('              z [<every> [<shift> [<vdd every>]]] | off (offset tracking),')
+		print('              i [on | off | reset] (instrumentation, dumps statistics),')
 		print('              x (exit)')
+		print('Batch: <id>:<cmd> [args]; <id>:<cmd> ...  (one @BEGIN..@END response block)')
+
+	def reading(self, key, value):
+		# key=value inside a batch, the interactive format otherwise
+		if self.batch:
+			print('%s=%s' % (key, value))
+		else:
+			print('%s: ' % key, value)
 
 	def cmd_readV(self, args):
-		voltage = self.rfDiodeSensor.readVoltage()
-		print('voltage: ', voltage)	
+		self.reading('voltage', self.rfDiodeSensor.readVoltage())
 	
 	def cmd_readT(self, args):
-		temperature = self.rfDiodeSensor.readTemperature()
-		print('temperature: ', temperature)
+		self.reading('temperature', self.rfDiodeSensor.readTemperature())
 	
 	def cmd_readP(self, args):
-		power = self.rfDiodeSensor.readPower()
-		print('power: ', power)
+		self.reading('power', self.rfDiodeSensor.readPower())
 	
 	def cmd_readAll(self, args):
-		voltage = self.rfDiodeSensor.readVoltage()
-		temperature = self.rfDiodeSensor.readTemperature()
-		power = self.rfDiodeSensor.readPower()
-		print('voltage: %f temperature: %.2f power: %f' % (voltage, temperature, power))
+		s = self.rfDiodeSensor.snapshot()
+		if self.batch:
+			print('voltage=%s temperature=%s power=%s' % (s.voltage, s.temperature, s.power))
+			return
+		print('voltage: %f temperature: %.2f power: %f' % (s.voltage, s.temperature, s.power))
+
+	def cmd_capture(self, args):
+		size = int(args[0]) if args else 256
+		if size > 0:
+			self.capturing = True
+			self.rfDiodeSensor.startAcquisition(size)
+			print('OK: Capture started, buffer size: %d' % size)
+		else:
+			self.capturing = False
+			self.rfDiodeSensor.stopAcquisition()
+			print('OK: Capture stopped, overruns: %d' % self.rfDiodeSensor.overruns)
+
+	def cmd_burst(self, args):
+		count = int(args[0]) if args else 120
+		if self.capturing:
+			raise RuntimeError('Capture running, stop it with c 0')
+		# buffers are kept between bursts, reallocated only to grow
+		if self.burst is None or self.burst.size < count:
+			self.burst = None
+			self.burst = burstCapture.burstCapture(self.rfDiodeSensor, count)
+		s = self.burst.capture(count)
+		if s is None:
+			raise RuntimeError('Burst timeout')
+		print('OK: burst n: %d sps: %.1f temperature: %.2f min: %f max: %f mean: %f rms: %f crest: %f' % (
+			s.n, s.sps, s.temperature, s.min, s.max, s.mean, s.rms, s.crest))
+		if len(args) > 1 and args[1] == 'raw':
+			burst = self.burst
+			for i in range(burst.count):
+				print('index: %d code: %d voltage: %f power: %f' % (
+					i, burst.codes[i], burst.voltages[i], burst.powers[i]))
+
+	def cmd_filter(self, args):
+		if args and args[0] == 'off':
+			self.rfDiodeSensor.filter = None
+		elif args:
+			self.rfDiodeSensor.filter = sampleFilters.parse(args)
+		chain = self.rfDiodeSensor.filter
+		if chain is None:
+			print('OK: filter: off')
+			return
+		print('OK: filter: %s' % chain)
+		for stage in chain.stages:
+			if isinstance(stage, sampleFilters.runningStats):
+				print('count: %d mean: %f variance: %f' % (stage.count, stage.mean, stage.variance))
+
+	def cmd_rate(self, args):
+		vsensor = self.rfDiodeSensor.voltageSensor
+		if args and args[0] == 'auto':
+			vsensor.setAdaptive(True)
+		elif len(args) == 1:
+			vsensor.setProfile(args[0])
+		elif len(args) == 2:
+			vsensor.setRate(args[0], args[1])
+		elif args:
+			raise ValueError('usage: r [auto | <profile> | <cdiv> <rate>]')
+		adaptive = vsensor.adaptive
+		print('OK: rate: %.1f sps settling: %.1f ms adaptive: %s profile: %s' % (
+			vsensor.adc.update_rate, vsensor.adc.settling_time_ms(),
+			'on' if adaptive is not None else 'off', vsensor.profileName or '-'))
+		if adaptive is not None:
+			print('variance: %f switches: %d' % (adaptive.variance, adaptive.switches))
+
+	def cmd_offset(self, args):
+		vsensor = self.rfDiodeSensor.voltageSensor
+		if args and args[0] == 'off':
+			vsensor.setOffsetTracker(None)
+		elif args:
+			vsensor.setOffsetTracker(offsetTracker.offsetTracker(*[int(a) for a in args[:3]]))
+		tracker = vsensor.offset
+		if tracker is None:
+			print('OK: offset: off')
+			return
+		print('OK: offset: %s duty: %.4f zeros: %d offset_lsb: %d offset_v: %e vdd: %s' % (
+			tracker, tracker.duty, tracker.zeros, tracker.offset,
+			vsensor.codeToVoltage(tracker.offset),
+			'-' if tracker.vdd is None else '%.3f' % tracker.vdd))
+
+	def cmd_instrumentation(self, args):
+		if args and args[0] == 'on':
+			instrumentation.enable(True)
+		elif args and args[0] == 'off':
+			instrumentation.enable(False)
+		elif args and args[0] == 'reset':
+			instrumentation.reset()
+		print('OK: instrumentation')
+		instrumentation.dump()
 
 	def cmd_echo(self, args):
 		print('OK:', ' '.join(args))
 
+	def cmd_trigger(self, args):
+		if args and args[0] == 'off':
+			self.trigger = None
+		elif args:
+			self.trigger = reportTrigger.parse(args)
+		if self.trigger is None:
+			print('OK: trigger: off')
+			return
+		print('OK: trigger: %s samples: %d reports: %d' % (
+			self.trigger, self.trigger.samples, self.trigger.reports))
+
 	def cmd_loop(self, args):
 		count = int(args[0]) if args else 10
+		period_ms = int(args[1]) if len(args) > 1 else RATE_LIMIT_MS
+		trigger = self.trigger
+		if trigger is None and count == 0:
+			raise ValueError('l 0 needs a trigger, see e')
 		print('OK: Starting loop, Ctrl-C to interrupt')
+		# buffered samples arrive at the ADC rate, no deadlines needed;
+		# period 0 samples back to back at the ADC rate as well
+		overlap = not self.capturing
+		sched = deadlineScheduler.deadlineScheduler(period_ms) if overlap and period_ms > 0 else None
+		if trigger is not None:
+			trigger.reset()
 		i = 0
+		n = 0
 		try:
-			while i < count:
+			if sched is not None:
+				sched.start()
+			if overlap:
+				self.rfDiodeSensor.startConversion()
+			while count == 0 or i < count:
 				if self.paused:
 					time.sleep(0.1)
 					continue
-				print('index: %d ' % i, end="")
-				self.cmd_readAll([])
+				if sched is not None:
+					sched.wait()
+				s = self.rfDiodeSensor.snapshot()
+				# next conversion runs while printing and waiting
+				if overlap and (count == 0 or i + 1 < count):
+					self.rfDiodeSensor.startConversion()
+				reason = None if trigger is None else trigger.process(s)
+				if trigger is None or reason is not None:
+					t = instrumentation.start()
+					if reason is None:
+						print('index: %d voltage: %f temperature: %.2f power: %f' % (
+							i, s.voltage, s.temperature, s.power))
+					else:
+						print('index: %d voltage: %f temperature: %.2f power: %f event: %s suppressed: %d' % (
+							i, s.voltage, s.temperature, s.power, reason, trigger.reported()))
+					instrumentation.stop(instrumentation.PRINT, t)
+					n += 1
+				instrumentation.sample_heap()
 				i += 1
 				self.handle_pause()
-				time.sleep(RATE_LIMIT_MS / 1000)
 		except KeyboardInterrupt:
 			print('OK: Loop interrupted')
+			if overlap:
+				# the conversion started for the next sample is still pending
+				self.rfDiodeSensor.readCode()
+		if trigger is not None:
+			print('OK: samples: %d reports: %d suppressed: %d' % (i, n, trigger.suppressed))
+		if sched is not None:
+			print('OK: period_ms: %d missed: %d jitter_mean_us: %d jitter_max_us: %d' % (
+				period_ms, sched.missed, sched.jitter_mean_us, sched.jitter_max_us))
+
+	def cmd_binaryLoop(self, args):
+		# fixed-size binary frames, see binaryFrame.py, no rate limit
+		count = int(args[0]) if args else 10
+		print('OK: Starting binary loop, %d frames of %d bytes' % (count, binaryFrame.FRAME_SIZE))
+		# text still buffered in sys.stdout must go out before the frames
+		if hasattr(sys.stdout, 'flush'):
+			sys.stdout.flush()
+		out = sys.stdout.buffer
+		encoder = binaryFrame.frameEncoder()
+		rfds = self.rfDiodeSensor
+		temp_code = rfds.readTemperatureCode()
+		temp_ticks = time.ticks_ms()
+		i = 0
+		try:
+			while i < count:
+				if self.paused:
+					time.sleep(0.1)
+					continue
+				code = rfds.readCode()
+				ticks = time.ticks_ms()
+				# temperature changes slowly, refresh it only after the TTL
+				if time.ticks_diff(ticks, temp_ticks) >= rfds.temperature_ttl_ms:
+					temp_code = rfds.readTemperatureCode()
+					temp_ticks = ticks
+				out.write(encoder.encode(ticks, 0xffffffff if code is None else code, temp_code))
+				i += 1
+				self.handle_pause()
+		except KeyboardInterrupt:
+			pass
+		print('\nOK: Binary loop done, frames: %d' % i)
+
+	def cmd_log(self, args):
+		# flash logging without host, see flashLogger.py
+		count = int(args[0]) if args else 0
+		period_ms = int(args[1]) if len(args) > 1 else RATE_LIMIT_MS
+		rfds = self.rfDiodeSensor
+		logger = flashLogger.flashLogger()
+		logger.start()
+		print('OK: Logging to %s, Ctrl-C to interrupt' % logger.name)
+		sched = None if self.capturing else deadlineScheduler.deadlineScheduler(period_ms)
+		temp_code = rfds.readTemperatureCode()
+		temp_ticks = time.ticks_ms()
+		i = 0
+		try:
+			if sched is not None:
+				sched.start()
+				rfds.startConversion()
+			while count == 0 or i < count:
+				if sched is not None:
+					sched.wait()
+				code = rfds.readCode()
+				ticks = time.ticks_ms()
+				if sched is not None:
+					rfds.startConversion()
+				if time.ticks_diff(ticks, temp_ticks) >= rfds.temperature_ttl_ms:
+					temp_code = rfds.readTemperatureCode()
+					temp_ticks = ticks
+				logger.log(ticks, code, temp_code)
+				# flash writes run while the next conversion is pending
+				logger.service()
+				i += 1
+		except KeyboardInterrupt:
+			pass
+		if sched is not None:
+			rfds.readCode()
+		logger.stop()
+		print('OK: Logging done, records: %d dropped: %d file: %s' % (
+			logger.records, logger.dropped, logger.name))
+
+	def cmd_logs(self, args):
+		if len(args) == 2 and args[0] == 'rm':
+			for name, size in flashLogger.list_logs():
+				if args[1] in ('all', name):
+					os.remove(name)
+			print('OK: removed')
+		elif args:
+			self.dump_log(args[0])
+			return
+		print('OK: logs')
+		for name, size in flashLogger.list_logs():
+			print('name: %s bytes: %d records: %d' % (
+				name, size, max(0, size - flashLogger.HEADER_SIZE) // binaryFrame.FRAME_SIZE))
+
+	def dump_log(self, name):
+		# raw file content including the header, read by sensorClient.logReader
+		size = os.stat(name)[6]
+		print('OK: Dumping %s, %d bytes' % (name, size))
+		if hasattr(sys.stdout, 'flush'):
+			sys.stdout.flush()
+		out = sys.stdout.buffer
+		buf = bytearray(512)
+		with open(name, 'rb') as f:
+			left = size
+			while left > 0:
+				n = f.readinto(buf)
+				if not n:
+					break
+				n = min(n, left)
+				out.write(memoryview(buf)[:n])
+				left -= n
+		print('\nOK: Dump done')
 
 	def handle_pause(self):
 		# Stub: In real hardware, check for space bar press to pause/resume
@@ -0,0 +1,64 @@
+# MicroPython drift-free periodic scheduler based on absolute ticks_us deadlines
+import time
+
+class deadlineScheduler:
+    def __init__(self, period_ms):
+        """
+        Create scheduler
+
+        Args:
+            period_ms: sample period in milliseconds, deadlines are spaced
+                       exactly by the period independent of the work done
+                       between two calls of wait()
+        """
+        self.period_us = int(period_ms * 1000)
+        self._next = None
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.missed = 0
+        self.jitter_max_us = 0
+        self._jitter_sum = 0
+
+    def start(self):
+        self.reset()
+        self._next = time.ticks_add(time.ticks_us(), self.period_us)
+
+    def wait(self):
+        """sleeps until the next deadline, deadlines that already passed by
+           more than a period are counted as missed and skipped"""
+        if self._next is None:
+            self.start()
+        _late = time.ticks_diff(time.ticks_us(), self._next)
+        if _late >= self.period_us:
+            _skip = _late // self.period_us
+            self.missed += _skip
+            self._next = time.ticks_add(self._next, _skip * self.period_us)
+        elif _late < 0:
+            # coarse sleep first, then spin for the last millisecond
+            if _late < -1000:
+                time.sleep_ms((-_late - 1000) // 1000)
+            while time.ticks_diff(time.ticks_us(), self._next) < 0:
+                pass
+        _jitter = time.ticks_diff(time.ticks_us(), self._next)
+        self.count += 1
+        self._jitter_sum += _jitter
+        if _jitter > self.jitter_max_us:
+            self.jitter_max_us = _jitter
+        self._next = time.ticks_add(self._next, self.period_us)
+
+    @property
+    def jitter_mean_us(self):
+        return self._jitter_sum / self.count if self.count else 0.0
+
+if __name__ == "__main__":
+    # Hello Scheduler!
+    sched = deadlineScheduler(50)
+    sched.start()
+    t0 = time.ticks_ms()
+    for i in range(20):
+        sched.wait()
+        print(i, time.ticks_diff(time.ticks_ms(), t0))
+        time.sleep_ms(i % 5 * 10)
+    print("missed: ", sched.missed, "jitter mean/max us: ", sched.jitter_mean_us, sched.jitter_max_us)
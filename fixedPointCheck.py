@@ -0,0 +1,71 @@
+# Equivalence check of the fixed-point measurement path against the float
+# path, asserts the error bounds. Runs on the device or on CPython:
+#   python fixedPointCheck.py [code step]
+# step 1 sweeps all 2**24 codes (about four minutes on CPython)
+import sys
+try:
+    import machine
+except ImportError:
+    import simMachine
+    simMachine.install()
+import AD7791.AD7791 as AD7791
+import AD7415.AD7415 as AD7415
+import rfDiodeSensor
+
+# rounding to µV (0.5) plus Vref rounded to µV (0.5, scaled by code / 2**24);
+# for the power scaled by at most (300 + 500) / 400 = 2 at 125 °C, plus the
+# rounding of the power itself
+UV_BOUND = 1.0
+POWER_BOUND = 1.5
+
+# AD7415 operating range in 1/4 °C
+_QUARTERS = range(-55 * 4, 125 * 4 + 1)
+
+def check_microvolts(ref_voltage, step=1):
+    """max |µV - float voltage * 1e6| over the code range, the float voltage
+       as AD7791.unipolar_voltage() computes it from Vref in V"""
+    ref_uv = AD7791.ref_microvolts(ref_voltage)
+    _max = 0.0
+    for code in range(0, 0x1000000, step):
+        _e = abs(AD7791.code_to_microvolts(code, ref_uv) - code / 0x1000000 * ref_voltage * 1000000)
+        if _e > _max:
+            _max = _e
+    return _max
+
+def check_quarters():
+    """every 10-bit temperature word, quarters against code_to_celsius()"""
+    for word in range(0, 0x10000, 0x40):
+        assert AD7415.code_to_quarters(word) / 4 == AD7415.code_to_celsius(word), hex(word)
+
+def check_power(ref_voltage, step=1):
+    """max |fixed power - float power * POWER_SCALE| over the code range at
+       every temperature step of the AD7415"""
+    rfds = rfDiodeSensor.rfDiodeSensor(None, None)
+    ref_uv = AD7791.ref_microvolts(ref_voltage)
+    _max = 0.0
+    # full code range at a few temperatures, all temperatures on a coarse grid
+    for q in (-220, 0, 100, 500):
+        for code in range(0, 0x1000000, step):
+            _max = max(_max, _power_error(rfds, code, q, ref_voltage, ref_uv))
+    for q in _QUARTERS:
+        for code in range(0, 0x1000000, 0xfff1):
+            _max = max(_max, _power_error(rfds, code, q, ref_voltage, ref_uv))
+    return _max
+
+def _power_error(rfds, code, q, ref_voltage, ref_uv):
+    _p = rfds.powerFixed(AD7791.code_to_microvolts(code, ref_uv), q)
+    return abs(_p - rfds.power(code / 0x1000000 * ref_voltage, q / 4) * rfDiodeSensor.POWER_SCALE)
+
+def run(step=1):
+    check_quarters()
+    print('check: quarters ok')
+    for ref in (2.5, 1.2345678, 1.2345675, 3.3, 5.0):
+        _e = check_microvolts(ref, step)
+        print('check: microvolts ref: %s max_error_uv: %f' % (ref, _e))
+        assert _e <= UV_BOUND
+    _e = check_power(2.5, step)
+    print('check: power max_error: %f (1/%d)' % (_e, rfDiodeSensor.POWER_SCALE))
+    assert _e <= POWER_BOUND
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 1)
@@ -0,0 +1,246 @@
+# MicroPython binary data logger to local flash for unattended soak tests
+#
+# Records are binaryFrame frames (16 bytes, CRC protected). log() only packs
+# a record into one of two RAM buffers, all file I/O happens in service(),
+# which the sampling loop calls while the next conversion is pending. A full
+# buffer is written in one block-aligned write; when the second buffer fills
+# up before the first one is written, records are dropped and counted, the
+# sampling loop is never held up by flash.
+#
+# Every file starts with a 64-byte header describing the record layout:
+#
+# offset size field
+#      0    4 magic b'RFLG'
+#      4    1 header version (1)
+#      5    1 reserved
+#      6    2 header size
+#      8    2 record size
+#     10    2 file index
+#     12    4 time.ticks_ms() when the file was started
+#     16   16 struct format of a record, NUL padded
+#     32   32 comma separated field names, NUL padded
+import struct
+import time
+import binaryFrame
+try:
+    import uos as os
+except ImportError:
+    import os
+
+HEADER_FORMAT = '<4sBBHHHI16s32s'
+HEADER_SIZE = 64
+HEADER_MAGIC = b'RFLG'
+HEADER_VERSION = 1
+RECORD_FIELDS = b'sync,seq,ticks,code,temp,crc'
+
+def _name(prefix, index):
+    return '%s%03d.bin' % (prefix, index)
+
+def _index(path, prefix):
+    # file index from a log file path, every digit between prefix and .bin,
+    # %03d only pads, log1000.bin follows log999.bin
+    return int(path[path.rfind('/') + 1:][len(_split(prefix)[1]):-4])
+
+def _split(prefix):
+    # directory and file name prefix
+    _i = prefix.rfind('/')
+    if _i < 0:
+        return '.', prefix
+    return prefix[:_i] or '/', prefix[_i + 1:]
+
+def list_logs(prefix='log'):
+    """returns [(file name, size in bytes)] of all logs, oldest first, by
+       file index (not by name, log1000.bin sorts before log999.bin)"""
+    _dir, _base = _split(prefix)
+    logs = []
+    for name in os.listdir(_dir):
+        if name.startswith(_base) and name.endswith('.bin') and \
+           name[len(_base):-4].isdigit():
+            path = name if _dir == '.' else _dir.rstrip('/') + '/' + name
+            logs.append((int(name[len(_base):-4]), path, os.stat(path)[6]))
+    logs.sort()
+    return [(path, size) for _i, path, size in logs]
+
+class flashLogger:
+    def __init__(self, prefix='log', max_bytes=256 * 1024, max_files=4,
+                 block_size=512, blocks=4, flush_records=256, flush_ms=5000):
+        """
+        Create logger
+
+        Args:
+            prefix: file name prefix, files are <prefix>000.bin, ...
+            max_bytes: a new file is started once this size is reached
+            max_files: oldest files are removed beyond this count
+            block_size: flash block size, full buffers are multiples of it
+            blocks: buffer size in blocks, two buffers are allocated
+            flush_records, flush_ms: a partly filled buffer is written after
+                                     this many records or milliseconds
+        """
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.flush_records = flush_records
+        self.flush_ms = flush_ms
+        _size = block_size * blocks
+        if _size % binaryFrame.FRAME_SIZE or _size <= HEADER_SIZE:
+            raise ValueError("buffer size must be a multiple of the record size")
+        self._bufs = (bytearray(_size), bytearray(_size))
+        self._size = _size
+        self._encoder = binaryFrame.frameEncoder()
+        self._file = None
+        self.index = -1
+        self.records = 0
+        self.dropped = 0
+        self.running = False
+
+    def _header(self, buf, index):
+        struct.pack_into(HEADER_FORMAT, buf, 0, HEADER_MAGIC, HEADER_VERSION, 0,
+                         HEADER_SIZE, binaryFrame.FRAME_SIZE, index & 0xffff,
+                         time.ticks_ms() & 0xffffffff,
+                         binaryFrame.FRAME_FORMAT.encode(), RECORD_FIELDS)
+
+    def _open_next(self):
+        if self._file is not None:
+            self._file.close()
+        self.index += 1
+        self._file = open(_name(self.prefix, self.index), 'wb')
+        self._file_bytes = 0
+        # rotation: keep at most max_files logs
+        logs = list_logs(self.prefix)
+        for name, _size in logs[:max(0, len(logs) - self.max_files)]:
+            os.remove(name)
+
+    def start(self):
+        """starts a new file after the existing ones"""
+        logs = list_logs(self.prefix)
+        self.index = _index(logs[-1][0], self.prefix) if logs else -1
+        self._open_next()
+        self._cur = 0
+        self._header(self._bufs[0], self.index)
+        self._fill = HEADER_SIZE
+        self._written = 0           # bytes of the current buffer on flash
+        self._pending = None        # full buffer waiting for service()
+        self._pending_written = 0
+        self._rotate = False
+        self._since = 0
+        self._flush_ticks = time.ticks_ms()
+        self.records = 0
+        self.dropped = 0
+        self.running = True
+
+    def log(self, ticks, code, temp_code):
+        """appends one record to the RAM buffer, no flash access"""
+        if not self.running:
+            return
+        if self._fill == self._size:
+            if self._pending is not None:
+                # flash is behind, drop instead of waiting for it
+                self.dropped += 1
+                return
+            self._swap()
+        self._encoder.encode_into(self._bufs[self._cur], self._fill, ticks,
+                                  0xffffffff if code is None else code, temp_code)
+        self._fill += binaryFrame.FRAME_SIZE
+        self._since += 1
+        self.records += 1
+
+    def _swap(self):
+        # hands the full buffer to service(), continues in the other one
+        self._pending = self._cur
+        self._pending_written = self._written
+        self._file_bytes += self._size
+        self._cur ^= 1
+        self._fill = 0
+        self._written = 0
+        if self._file_bytes >= self.max_bytes:
+            # the next buffer belongs to a new file and starts with its header
+            self._rotate = True
+            self._header(self._bufs[self._cur], self.index + 1)
+            self._fill = HEADER_SIZE
+
+    def _due(self):
+        return self._since >= self.flush_records or \
+               time.ticks_diff(time.ticks_ms(), self._flush_ticks) >= self.flush_ms
+
+    def service(self):
+        """does the pending file I/O, returns True if anything was written;
+           call it while the ADC converts"""
+        if not self.running:
+            return False
+        if self._pending is not None:
+            # the rest of a full buffer, ends on a block boundary
+            self._file.write(memoryview(self._bufs[self._pending])[self._pending_written:])
+            self._file.flush()
+            self._pending = None
+            if self._rotate:
+                self._rotate = False
+                self._open_next()
+            self._since = 0
+            self._flush_ticks = time.ticks_ms()
+            return True
+        if self._fill > self._written and self._due():
+            # timed flush of a partly filled buffer, only the new bytes go
+            # out, so the file content stays identical to full writes
+            self._file.write(memoryview(self._bufs[self._cur])[self._written:self._fill])
+            self._file.flush()
+            self._written = self._fill
+            self._since = 0
+            self._flush_ticks = time.ticks_ms()
+            return True
+        return False
+
+    def stop(self):
+        """writes everything buffered and closes the file"""
+        if not self.running:
+            return
+        if self._pending is not None:
+            self.service()
+        self._since = self.flush_records
+        self.service()
+        self._file.close()
+        self._file = None
+        self.running = False
+
+    @property
+    def name(self):
+        return _name(self.prefix, self.index)
+
+def read_header(f):
+    """reads a log header from an open file, returns a dict"""
+    magic, version, _res, hsize, rsize, index, ticks, fmt, names = \
+        struct.unpack(HEADER_FORMAT, f.read(HEADER_SIZE))
+    if magic != HEADER_MAGIC:
+        raise ValueError("not a log file")
+    return {'version': version, 'header_size': hsize, 'record_size': rsize,
+            'index': index, 'ticks': ticks,
+            'format': fmt.rstrip(b'\0').decode(),
+            'fields': names.rstrip(b'\0').decode().split(',')}
+
+if __name__ == "__main__":
+    # Hello Logger! small files and buffers to exercise rotation
+    import voltageSensor
+    import temperatureSensor
+    vsensor = voltageSensor.voltageSensor()
+    tsensor = temperatureSensor.temperatureSensor()
+    vsensor.setRate("CDIV1", "120sps")
+    logger = flashLogger('demolog', max_bytes=2048, max_files=2, block_size=256,
+                         blocks=2, flush_records=16, flush_ms=1000)
+    logger.start()
+    temp_code = tsensor.readCode()
+    for i in range(300):
+        code = vsensor.readCode()
+        vsensor.startConversion()
+        logger.log(time.ticks_ms(), code, temp_code)
+        logger.service()
+    vsensor.readCode()
+    logger.stop()
+    print("records: ", logger.records, "dropped: ", logger.dropped)
+    total = 0
+    for name, size in list_logs('demolog'):
+        with open(name, 'rb') as f:
+            header = read_header(f)
+            frames = binaryFrame.decode(f.read())
+        total += len(frames)
+        print(name, size, header, "frames: ", len(frames))
+        os.remove(name)
+    print("frames in the kept files: ", total)
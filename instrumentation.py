@@ -0,0 +1,87 @@
+# Lightweight hot-path instrumentation: per-stage tick counters, fixed-bucket
+# latency histograms, timeout counts and heap statistics in preallocated
+# storage. Disabled by default, start() then returns 0 and stop() returns
+# after one test.
+import time
+import gc
+from array import array
+
+CONV_WAIT = 0   # waiting for nRDY
+SPI = 1         # AD7791 data transfer
+I2C = 2         # AD7415 transaction
+POWER = 3       # power computation
+PRINT = 4       # output formatting
+
+STAGES = ('conv_wait', 'spi', 'i2c', 'power', 'print')
+
+# upper bucket edges in µs, the last bucket takes everything above
+BUCKETS_US = (50, 100, 200, 500, 1000, 2000, 5000, 10000, 20000, 50000, 100000, 200000)
+_NBUCKETS = len(BUCKETS_US) + 1
+
+enabled = False
+
+_count = array('l', [0] * len(STAGES))
+_total = array('q', [0] * len(STAGES))
+_max = array('l', [0] * len(STAGES))
+_timeouts = array('l', [0] * len(STAGES))
+_hist = array('l', [0] * (len(STAGES) * _NBUCKETS))
+_heap = array('l', [0, 0, -1])   # free, alloc, min free since reset
+
+def enable(on=True):
+    global enabled
+    enabled = on
+
+def reset():
+    for i in range(len(STAGES)):
+        _count[i] = 0
+        _total[i] = 0
+        _max[i] = 0
+        _timeouts[i] = 0
+    for i in range(len(_hist)):
+        _hist[i] = 0
+    _heap[2] = -1
+
+def start():
+    """returns a start timestamp for stop(), 0 while disabled"""
+    if not enabled:
+        return 0
+    return time.ticks_us()
+
+def stop(stage, t0):
+    """accounts the time since start() to stage"""
+    if not enabled or not t0:
+        return
+    _us = time.ticks_diff(time.ticks_us(), t0)
+    _count[stage] += 1
+    _total[stage] += _us
+    if _us > _max[stage]:
+        _max[stage] = _us
+    _b = 0
+    while _b < _NBUCKETS - 1 and _us > BUCKETS_US[_b]:
+        _b += 1
+    _hist[stage * _NBUCKETS + _b] += 1
+
+def timeout(stage):
+    if enabled:
+        _timeouts[stage] += 1
+
+def sample_heap():
+    """records heap usage, call once per measurement cycle"""
+    if not enabled or not hasattr(gc, 'mem_free'):
+        return
+    _free = gc.mem_free()
+    _heap[0] = _free
+    _heap[1] = gc.mem_alloc()
+    if _heap[2] < 0 or _free < _heap[2]:
+        _heap[2] = _free
+
+def dump():
+    """prints all statistics, one line per stage"""
+    print('instr: enabled: %d buckets_us: %s' % (enabled, ','.join([str(b) for b in BUCKETS_US])))
+    for i in range(len(STAGES)):
+        _n = _count[i]
+        print('stage: %s count: %d total_us: %d mean_us: %d max_us: %d timeouts: %d hist: %s' % (
+            STAGES[i], _n, _total[i], _total[i] // _n if _n else 0, _max[i], _timeouts[i],
+            ','.join([str(_hist[i * _NBUCKETS + b]) for b in range(_NBUCKETS)])))
+    if hasattr(gc, 'mem_free'):
+        print('heap: free: %d alloc: %d min_free: %d' % (gc.mem_free(), gc.mem_alloc(), _heap[2]))
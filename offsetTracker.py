@@ -0,0 +1,107 @@
+# MicroPython background zero-offset tracking for the AD7791
+# every n-th single conversion is taken from the shorted input AIN(-)-AIN(-)
+# instead of AIN, the filtered result is subtracted from the signal codes;
+# optionally some of these zero conversions read the Vdd monitor instead
+import AD7791.AD7791 as AD7791
+
+class offsetTracker:
+    def __init__(self, every=64, shift=3, vdd_every=0):
+        """
+        Create offset tracker
+
+        Args:
+            every: signal conversions between two zero conversions, the
+                   throughput cost is one conversion in every + 1
+            shift: the estimate follows new zero readings with weight
+                   1/2**shift, shift <= 6 as in sampleFilters.expSmoothing
+            vdd_every: every vdd_every-th zero conversion reads the Vdd
+                       monitor instead of the shorted input, 0 for never
+        """
+        if every < 1:
+            raise ValueError("offset interval must be >= 1")
+        if shift < 0 or shift > 6:
+            raise ValueError("offset smoothing shift must be 0..6")
+        self.every = every
+        self.shift = shift
+        self.vdd_every = vdd_every
+        self.reset()
+
+    def reset(self):
+        # offset in unipolar LSBs, Vdd in V, None until measured
+        self.offset = 0
+        self.vdd = None
+        self.zeros = 0
+        self._acc = None
+        self._count = 0
+        self._zero_count = 0
+
+    @property
+    def duty(self):
+        """fraction of conversions spent on zero measurements"""
+        return 1 / (self.every + 1)
+
+    def due(self):
+        return self._count >= self.every
+
+    def channel(self):
+        """(channel, coding) of the next zero conversion; the shorted input
+           is converted bipolar, so negative offsets are seen too"""
+        if self.vdd_every and self._zero_count % self.vdd_every == self.vdd_every - 1:
+            return AD7791.CHANNEL_VDD, AD7791.UNIPOLAR_CODING
+        return AD7791.CHANNEL_SHORT, AD7791.BIPOLAR_CODING
+
+    def update(self, channel, code):
+        """feeds the result of a zero conversion"""
+        self._count = 0
+        self._zero_count += 1
+        if channel == AD7791.CHANNEL_VDD:
+            self.vdd = code / 0x1000000 * AD7791.VDD_MONITOR_FULL_SCALE
+            return
+        # one bipolar LSB is two unipolar LSBs
+        _offset = (code - 0x800000) << 1
+        if self._acc is None:
+            self._acc = _offset << self.shift
+        else:
+            self._acc += _offset - (self._acc >> self.shift)
+        self.offset = self._acc >> self.shift
+        self.zeros += 1
+
+    def correct(self, code, bipolar=False):
+        """counts one signal conversion, returns its code minus the offset;
+           a bipolar LSB is two unipolar LSBs, so half the offset there"""
+        self._count += 1
+        code -= (self.offset >> 1) if bipolar else self.offset
+        if code < 0:
+            return 0
+        if code > 0xffffff:
+            return 0xffffff
+        return code
+
+    def __str__(self):
+        return 'every %d shift %d vdd %d' % (self.every, self.shift, self.vdd_every)
+
+if __name__ == "__main__":
+    # Hello Offset Tracker! on simulated hardware with a 1 mV ADC offset
+    import machine
+    import voltageSensor
+    if hasattr(machine, 'ad7791'):
+        machine.offset_voltage = 0.001
+    vsensor = voltageSensor.voltageSensor()
+    vsensor.setRate("CDIV1", "120sps")
+    tracker = offsetTracker(every=8, shift=2, vdd_every=4)
+    vsensor.setOffsetTracker(tracker)
+    for i in range(60):
+        v = vsensor.readVoltage()
+    print("voltage: ", v, "offset LSB: ", tracker.offset, "offset V: ",
+          vsensor.codeToVoltage(tracker.offset), "vdd: ", tracker.vdd,
+          "zeros: ", tracker.zeros, "duty: ", tracker.duty)
+    if hasattr(machine, 'ad7791'):
+        # the corrected voltage must be back at the true input voltage
+        assert abs(v - machine.ain_voltage) < 50e-6
+        assert abs(tracker.vdd - machine.vdd_voltage) < 0.01
+        # blocks of a bipolar profile are corrected by the same voltage
+        import acquisitionProfiles
+        out = vsensor.readBlock(32, profile=acquisitionProfiles.BIPOLAR)
+        v = sum(out) / len(out)
+        print("bipolar block voltage: ", v)
+        assert abs(v - machine.ain_voltage) < 50e-6
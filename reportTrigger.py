@@ -0,0 +1,136 @@
+# MicroPython report-by-exception trigger for rfDiodeSensor samples
+# samples are taken continuously, a record is only reported when the power
+# crosses a threshold (with hysteresis), moves by more than a delta since
+# the last report, or the heartbeat interval expires; every report carries
+# the number of samples suppressed before it
+import time
+
+# report reasons
+START = 'start'          # first sample
+HIGH = 'high'            # power rose above the high threshold
+LOW = 'low'              # power fell below the low threshold
+NORMAL = 'normal'        # back inside the thresholds by the hysteresis
+DELTA = 'delta'          # power moved by more than delta
+HEARTBEAT = 'heartbeat'  # nothing reported for heartbeat_ms
+ERROR = 'error'          # conversion timeout, power is NaN
+
+class reportTrigger:
+    def __init__(self, low=None, high=None, hysteresis=0.0, delta=None, heartbeat_ms=None):
+        """
+        Create trigger, all conditions are optional
+
+        Args:
+            low, high: power thresholds, in the unit of rfDiodeSensor.power()
+            hysteresis: a threshold state is left only this far inside again
+            delta: change of power since the last report that is reported
+            heartbeat_ms: longest time without a report
+        """
+        if low is not None and high is not None and low >= high:
+            raise ValueError("low threshold must be below high threshold")
+        self.low = low
+        self.high = high
+        self.hysteresis = hysteresis
+        self.delta = delta
+        self.heartbeat_ms = heartbeat_ms
+        self.reset()
+
+    def reset(self):
+        self.state = None       # NORMAL, HIGH, LOW, ERROR after the first sample
+        self.suppressed = 0     # samples suppressed since the last report
+        self.samples = 0
+        self.reports = 0
+        self._power = None
+        self._ticks = 0
+
+    def _level(self, p):
+        # threshold state for power p, hysteresis applies when leaving a state
+        if p != p:
+            return ERROR
+        if self.high is not None:
+            if p > self.high or (self.state == HIGH and p > self.high - self.hysteresis):
+                return HIGH
+        if self.low is not None:
+            if p < self.low or (self.state == LOW and p < self.low + self.hysteresis):
+                return LOW
+        return NORMAL
+
+    def process(self, sample):
+        """feeds a sample, returns None to suppress it or the report reason"""
+        self.samples += 1
+        p = sample.power
+        level = self._level(p)
+        if self.state is None:
+            reason = START
+        elif level != self.state:
+            reason = level
+        elif level == ERROR:
+            reason = None
+        elif self.delta is not None and abs(p - self._power) > self.delta:
+            reason = DELTA
+        elif self.heartbeat_ms is not None and \
+             time.ticks_diff(sample.ticks, self._ticks) >= self.heartbeat_ms:
+            reason = HEARTBEAT
+        else:
+            reason = None
+        self.state = level
+        if reason is None:
+            self.suppressed += 1
+            return None
+        self._power = p
+        self._ticks = sample.ticks
+        self.reports += 1
+        return reason
+
+    def reported(self):
+        """returns the suppressed count for the record just reported and
+           restarts it"""
+        n = self.suppressed
+        self.suppressed = 0
+        return n
+
+    def __str__(self):
+        parts = []
+        for name, value in (('lo', self.low), ('hi', self.high), ('hyst', self.hysteresis),
+                            ('delta', self.delta), ('hb', self.heartbeat_ms)):
+            if value is not None:
+                parts.append('%s %s' % (name, value))
+        return ' '.join(parts)
+
+_options = {
+    'lo': 'low',
+    'hi': 'high',
+    'hyst': 'hysteresis',
+    'delta': 'delta',
+}
+
+def parse(args):
+    """builds a reportTrigger from CLI arguments, e.g. hi 0.6 hyst 0.02 hb 10000"""
+    kwargs = {}
+    i = 0
+    while i + 1 < len(args) and (args[i] in _options or args[i] == 'hb'):
+        if args[i] == 'hb':
+            kwargs['heartbeat_ms'] = int(args[i + 1])
+        else:
+            kwargs[_options[args[i]]] = float(args[i + 1])
+        i += 2
+    if i < len(args):
+        raise ValueError("unknown trigger option: " + args[i])
+    return reportTrigger(**kwargs)
+
+if __name__ == "__main__":
+    # Hello Trigger! a power ramp through the thresholds and back
+    try:
+        from collections import namedtuple
+    except ImportError:
+        from ucollections import namedtuple
+    sample = namedtuple('sample', ('ticks', 'voltage', 'temperature', 'power'))
+    trigger = parse(['lo', '0.2', 'hi', '0.8', 'hyst', '0.05', 'delta', '0.3', 'hb', '500'])
+    print("trigger: ", trigger)
+    powers = [0.5] * 20 + [0.5 + 0.02 * i for i in range(20)] + [0.78, 0.76, 0.74] + \
+             [0.1] * 5 + [0.22, 0.26] + [float('nan')] * 3 + [0.5] * 50
+    for i in range(len(powers)):
+        reason = trigger.process(sample(i * 20, 0.0, 25.0, powers[i]))
+        if reason is not None:
+            print("index: %d power: %f event: %s suppressed: %d" % (
+                i, powers[i], reason, trigger.reported()))
+    print("samples: ", trigger.samples, "reports: ", trigger.reports)
@@ -1,24 +1,172 @@
 # MicroPython rfDiodeSensor class
 import voltageSensor
 import temperatureSensor
+import time
+import instrumentation
+try:
+    from collections import namedtuple
+except ImportError:
+    from ucollections import namedtuple
+
+# Immutable record of one coherent measurement, power is derived from
+# exactly the voltage and temperature stored alongside it
+sample = namedtuple('sample', ('ticks', 'voltage', 'temperature', 'power'))
+
+_NAN = float('nan')
+
+# Fixed-point path: voltage in µV, temperature in 1/4 °C, power in millionths
+# of the unit of power(); all small ints, floats only in toSample(). It is
+# meant for integer-only targets (no FPU, or where every float is a heap
+# allocation, as on MicroPython); on CPython and ports with hardware floats
+# the float path is faster, see benchmark.py make_float/make_fixed.
+# Equivalence with the float path is checked by fixedPointCheck.py
+POWER_SCALE = 1000000
+# measureFixed() output array indices
+FIXED_TICKS = 0
+FIXED_UV = 1
+FIXED_QUARTERS = 2
+FIXED_POWER = 3
 
 class rfDiodeSensor:
-    def __init__(self, voltageSensor, temperatureSensor):
+    def __init__(self, voltageSensor, temperatureSensor, temperature_ttl_ms=2000,
+                 calibration=None):
         self.voltageSensor = voltageSensor
         self.temperatureSensor = temperatureSensor
+        # calibration.calibrationTable, power is in dBm when set
+        self.calibration = calibration
+        # sampleFilters.filterChain applied to raw codes, None for no filtering
+        self.filter = None
+        # temperature changes on a timescale of seconds, so it is cached
+        self.temperature_ttl_ms = temperature_ttl_ms
+        self._temperature = None
+        self._temperature_ticks = 0
+        self._quarters = None
+        self._quarters_ticks = 0
+
+    def readCode(self):
+        # raw ADC code, None on timeout
+        if self.filter is None:
+            return self.voltageSensor.readCode()
+        # feed codes through the filter chain until it releases one
+        while True:
+            code = self.voltageSensor.readCode()
+            if code is None:
+                return None
+            code = self.filter.process(code)
+            if code is not None:
+                return code
+
+    def startConversion(self):
+        # next readCode() or snapshot() picks up this conversion
+        self.voltageSensor.startConversion()
 
     def readVoltage(self):
-        return self.voltageSensor.readVoltage()
+        code = self.readCode()
+        if code is None:
+            raise voltageSensor.conversionTimeout("AD7791 conversion timeout")
+        return self.voltageSensor.codeToVoltage(code)
+
+    def readTemperatureCode(self):
+        # raw 16-bit AD7415 temperature register
+        return self.temperatureSensor.readCode()
 
     def readTemperature(self):
-        return self.temperatureSensor.readTemperature()
+        self._temperature = self.temperatureSensor.readTemperature()
+        self._temperature_ticks = time.ticks_ms()
+        return self._temperature
+
+    def cachedTemperature(self):
+        # returns the last temperature unless it is older than the TTL
+        if self._temperature is None or \
+           time.ticks_diff(time.ticks_ms(), self._temperature_ticks) >= self.temperature_ttl_ms:
+            return self.readTemperature()
+        return self._temperature
+
+    def cachedQuarters(self):
+        # temperature in 1/4 °C for the fixed-point path, same TTL as above
+        if self._quarters is None or \
+           time.ticks_diff(time.ticks_ms(), self._quarters_ticks) >= self.temperature_ttl_ms:
+            self._quarters = self.temperatureSensor.readQuarters()
+            self._quarters_ticks = time.ticks_ms()
+        return self._quarters
+
+    def startAcquisition(self, size=256):
+        self.voltageSensor.startAcquisition(size)
+
+    def stopAcquisition(self):
+        self.voltageSensor.stopAcquisition()
+
+    @property
+    def overruns(self):
+        return self.voltageSensor.overruns
+
+    def power(self, voltage, temperature):
+        _t = instrumentation.start()
+        if self.calibration is not None:
+            _p = self.calibration.dbm(voltage, temperature)
+        else:
+            # Example: simple linear conversion, used without calibration table
+            # For demonstration, assume power = voltage * (1 + 0.01*(temperature-25))
+            _p = voltage * (1 + 0.01 * (temperature - 25))
+        instrumentation.stop(instrumentation.POWER, _t)
+        return _p
+
+    def powerFixed(self, uv, quarters):
+        """power() in integer units of 1/POWER_SCALE from µV and 1/4 °C, for
+           integer-only targets; the calibration table is float, with it
+           only the result is scaled"""
+        _t = instrumentation.start()
+        if self.calibration is not None:
+            _p = int(self.calibration.dbm(uv / 1000000, quarters / 4) * POWER_SCALE)
+        else:
+            # uv * (1 + 0.01*(t - 25)) = uv * (300 + quarters) / 400, uv is
+            # split so that the products stay in small-int range (no divmod,
+            # its tuple would be allocated)
+            _k = 300 + quarters
+            _a = (uv >> 12) * _k
+            _q = _a // 400
+            _p = (_q << 12) + (((_a - _q * 400) << 12) + (uv & 0xfff) * _k + 200) // 400
+        instrumentation.stop(instrumentation.POWER, _t)
+        return _p
 
     def readPower(self):
-        # Example: simple linear conversion, replace with real formula as needed
-        voltage = self.readVoltage()
-        temperature = self.readTemperature()
-        # For demonstration, assume power = voltage * (1 + 0.01*(temperature-25))
-        return voltage * (1 + 0.01 * (temperature - 25))
+        return self.snapshot().power
+
+    def snapshot(self):
+        # one voltage reading, one (cached) temperature, power derived from both
+        return self.makeSample(self.readCode())
+
+    def makeSample(self, code):
+        # sample record from a raw code and the cached temperature, a
+        # timeout (code None) is flagged by NaN voltage and power
+        voltage = _NAN if code is None else self.voltageSensor.codeToVoltage(code)
+        temperature = self.cachedTemperature()
+        return sample(time.ticks_ms(), voltage, temperature,
+                      self.power(voltage, temperature))
+
+    def measureFixed(self, out):
+        """one measurement into the preallocated out (4 ints, FIXED_* indices):
+           ticks, µV, 1/4 °C and power; returns out, None on timeout"""
+        return self.makeFixed(self.readCode(), out)
+
+    def makeFixed(self, code, out):
+        """fixed-point counterpart of makeSample(), fills out from a raw code
+           and the cached temperature, None for a timeout (code None); with
+           small ints nothing is allocated, benchmark.py make_fixed"""
+        if code is None:
+            return None
+        out[FIXED_TICKS] = time.ticks_ms()
+        _uv = self.voltageSensor.codeToMicrovolts(code)
+        _q = self.cachedQuarters()
+        out[FIXED_UV] = _uv
+        out[FIXED_QUARTERS] = _q
+        out[FIXED_POWER] = self.powerFixed(_uv, _q)
+        return out
+
+    def toSample(self, fixed):
+        # output boundary: fixed-point measurement to a float sample record
+        return sample(fixed[FIXED_TICKS], fixed[FIXED_UV] / 1000000,
+                      fixed[FIXED_QUARTERS] / 4, fixed[FIXED_POWER] / POWER_SCALE)
 
 if __name__ == "__main__":
     vsensor=voltageSensor.voltageSensor()
@@ -28,3 +176,8 @@ if __name__ == "__main__":
     print("Voltage: ", rfds.readVoltage())
     print("Temperature: ", rfds.readTemperature())
     print("Power: ", rfds.readPower())
+    print("Snapshot: ", rfds.snapshot())
+    from array import array
+    fixed = array('l', [0, 0, 0, 0])
+    print("Fixed: ", rfds.toSample(rfds.measureFixed(fixed)))
+
@@ -0,0 +1,55 @@
+# MicroPython fixed-size ring buffer for raw ADC codes
+from array import array
+
+class ringBuffer:
+    def __init__(self, size=256):
+        # one slot stays empty to tell a full buffer from an empty one,
+        # head is only written by the producer, tail only by the consumer
+        self._len = size + 1
+        self._buf = array('l', [0] * self._len)
+        self._head = 0
+        self._tail = 0
+        self.overruns = 0
+
+    def __len__(self):
+        return (self._head - self._tail) % self._len
+
+    @property
+    def size(self):
+        return self._len - 1
+
+    def clear(self):
+        self._tail = self._head
+        self.overruns = 0
+
+    def put(self, value):
+        # called from the nRDY interrupt handler, must not allocate
+        _next = self._head + 1
+        if _next == self._len:
+            _next = 0
+        if _next == self._tail:
+            self.overruns += 1
+            return False
+        self._buf[self._head] = value
+        self._head = _next
+        return True
+
+    def get(self):
+        # returns the oldest value or None if the buffer is empty
+        if self._tail == self._head:
+            return None
+        _value = self._buf[self._tail]
+        _next = self._tail + 1
+        if _next == self._len:
+            _next = 0
+        self._tail = _next
+        return _value
+
+if __name__ == "__main__":
+    # Hello Ring Buffer!
+    rb = ringBuffer(4)
+    for i in range(6):
+        rb.put(i)
+    print("len: ", len(rb), "overruns: ", rb.overruns)
+    while len(rb):
+        print(rb.get())
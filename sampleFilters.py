@@ -0,0 +1,151 @@
+# MicroPython filter stages working on raw integer ADC codes
+# every stage has process(code) returning the filtered code, or None while
+# a decimating stage withholds its output, and reset()
+from array import array
+
+class movingAverage:
+    # boxcar over the last n codes, n < 64 keeps the running sum of
+    # 24-bit codes within the MicroPython small int range
+    def __init__(self, n):
+        if n < 1 or n > 63:
+            raise ValueError("moving average length must be 1..63")
+        self.n = n
+        self._buf = array('l', [0] * n)
+        self.reset()
+
+    def reset(self):
+        for _i in range(self.n):
+            self._buf[_i] = 0
+        self._i = 0
+        self._sum = 0
+        self._count = 0
+
+    def process(self, code):
+        self._sum += code - self._buf[self._i]
+        self._buf[self._i] = code
+        self._i += 1
+        if self._i == self.n:
+            self._i = 0
+        if self._count < self.n:
+            self._count += 1
+        return self._sum // self._count
+
+    def __str__(self):
+        return 'avg %d' % self.n
+
+class expSmoothing:
+    # y += (x - y) / 2**shift, the state is kept scaled by 2**shift so no
+    # resolution is lost, shift <= 6 keeps it within the small int range
+    def __init__(self, shift):
+        if shift < 1 or shift > 6:
+            raise ValueError("smoothing shift must be 1..6")
+        self.shift = shift
+        self.reset()
+
+    def reset(self):
+        self._acc = None
+
+    def process(self, code):
+        if self._acc is None:
+            self._acc = code << self.shift
+        else:
+            self._acc += code - (self._acc >> self.shift)
+        return self._acc >> self.shift
+
+    def __str__(self):
+        return 'ema %d' % self.shift
+
+class decimate:
+    # passes every n-th code, put it behind an averaging stage
+    def __init__(self, n):
+        if n < 1:
+            raise ValueError("decimation factor must be >= 1")
+        self.n = n
+        self.reset()
+
+    def reset(self):
+        self._count = 0
+
+    def process(self, code):
+        self._count += 1
+        if self._count < self.n:
+            return None
+        self._count = 0
+        return code
+
+    def __str__(self):
+        return 'dec %d' % self.n
+
+class runningStats:
+    # pass-through stage keeping mean and variance (Welford)
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def process(self, code):
+        self.count += 1
+        _delta = code - self.mean
+        self.mean += _delta / self.count
+        self._m2 += _delta * (code - self.mean)
+        return code
+
+    @property
+    def variance(self):
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def __str__(self):
+        return 'stats'
+
+class filterChain:
+    def __init__(self, stages=None):
+        self.stages = stages if stages is not None else []
+
+    def reset(self):
+        for stage in self.stages:
+            stage.reset()
+
+    def process(self, code):
+        for stage in self.stages:
+            code = stage.process(code)
+            if code is None:
+                return None
+        return code
+
+    def __str__(self):
+        return ' '.join([str(stage) for stage in self.stages])
+
+_stage_types = {
+    'avg': movingAverage,
+    'ema': expSmoothing,
+    'dec': decimate,
+}
+
+def parse(args):
+    """builds a filterChain from CLI arguments, e.g. avg 16 dec 16 stats"""
+    stages = []
+    i = 0
+    while i < len(args):
+        if args[i] == 'stats':
+            stages.append(runningStats())
+            i += 1
+        elif args[i] in _stage_types and i + 1 < len(args):
+            stages.append(_stage_types[args[i]](int(args[i + 1])))
+            i += 2
+        else:
+            raise ValueError("unknown filter stage: " + args[i])
+    return filterChain(stages)
+
+if __name__ == "__main__":
+    # Hello Filters!
+    chain = parse(['avg', '4', 'dec', '4', 'stats'])
+    print("chain: ", chain)
+    for code in range(1000, 1032):
+        out = chain.process(code)
+        if out is not None:
+            print(code, out)
+    stats = chain.stages[-1]
+    print("count: ", stats.count, "mean: ", stats.mean, "variance: ", stats.variance)
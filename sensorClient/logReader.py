@@ -0,0 +1,71 @@
+"""
+Host-side reader for the flash logs written by flashLogger.py
+
+The header of each file describes the record layout, open_log() turns it
+into a NumPy dtype and memory-maps the records, so even large logs are
+not read into memory until they are used.
+
+    records = open_log('log000.bin')        # structured array, memory-mapped
+    records = read_logs(['log000.bin', 'log001.bin'], valid_only=True)
+
+Logs are fetched from the device with sensorClient.download().
+"""
+import sys
+import flashLogger
+from sensorClient.sensorClient import _valid_frames
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# struct format characters with standard sizes
+_NUMPY_TYPES = {'b': 'i1', 'B': 'u1', 'h': 'i2', 'H': 'u2', 'i': 'i4', 'I': 'u4',
+                'l': 'i4', 'L': 'u4', 'q': 'i8', 'Q': 'u8', 'f': 'f4', 'd': 'f8'}
+
+def header(path):
+    """returns the header of a log file as a dict"""
+    with open(path, 'rb') as f:
+        return flashLogger.read_header(f)
+
+def record_dtype(hdr):
+    """NumPy structured dtype from the format and field names of a header"""
+    fmt = hdr['format']
+    order = '>' if fmt[0] in '>!' else '<'
+    types = [order + _NUMPY_TYPES[c] for c in fmt.lstrip('<>!=@')]
+    dtype = np.dtype(list(zip(hdr['fields'], types)))
+    if dtype.itemsize != hdr['record_size']:
+        raise ValueError('record format does not match the record size')
+    return dtype
+
+def open_log(path):
+    """memory-maps the records of one log file into a structured array"""
+    if np is None:
+        raise ImportError('NumPy is required to map log files')
+    hdr = header(path)
+    dtype = record_dtype(hdr)
+    with open(path, 'rb') as f:
+        f.seek(0, 2)
+        n = (f.tell() - hdr['header_size']) // hdr['record_size']
+    if n <= 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', offset=hdr['header_size'], shape=(n,))
+
+def read_logs(paths, valid_only=False):
+    """concatenates the records of several log files, optionally only the
+       ones with a valid sync word and CRC"""
+    parts = []
+    for path in paths:
+        records = open_log(path)
+        if valid_only:
+            records = _valid_frames(records.tobytes())
+        parts.append(records)
+    return np.concatenate(parts) if parts else parts
+
+if __name__ == "__main__":
+    # Hello Log Reader! python -m sensorClient.logReader log000.bin ...
+    for path in sys.argv[1:]:
+        hdr = header(path)
+        records = open_log(path)
+        print(path, hdr, 'records: ', len(records))
+        if len(records):
+            print(records[:3])
@@ -0,0 +1,426 @@
+"""
+Host-side client for the RF power sensor CLI over a serial port
+
+Drives the CLI protocol (one command line in, output terminated by the
+next '> ' prompt), pipelines commands, parses measurement blocks in bulk
+into NumPy arrays when NumPy is installed and reconnects after link
+errors. sensorClient is synchronous, asyncSensorClient offers the same
+calls for asyncio.
+
+    client = sensorClient('/dev/ttyACM0')
+    data = client.loop(100, 50)         # n x (voltage, temperature, power)
+    frames = client.frames(1000)        # binary frames, see binaryFrame.py
+
+Without hardware, spawn_simulated() runs cli.py on simulated hardware
+behind a pty and returns the process and the pty master fd.
+"""
+import os
+import re
+import sys
+import time
+import select
+import asyncio
+import binaryFrame
+try:
+    import serial
+except ImportError:
+    serial = None
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+PROMPT = b'> '
+
+_ALL_RE = re.compile(r'voltage: (\S+) temperature: (\S+) power: (\S+)')
+
+if np is not None:
+    FRAME_DTYPE = np.dtype([('sync', '<u2'), ('seq', '<u2'), ('ticks', '<u4'),
+                            ('code', '<u4'), ('temp', '<u2'), ('crc', '<u2')])
+    _CRC_TABLE = np.array(binaryFrame._crc_table, dtype=np.uint32)
+
+class sensorError(Exception):
+    pass
+
+def _valid_frames(data):
+    """decodes a block of raw frames, frames with a bad sync word or CRC
+       are dropped; NumPy structured array or list of tuples"""
+    if np is None:
+        return binaryFrame.decode(data)
+    n = len(data) // binaryFrame.FRAME_SIZE
+    data = data[:n * binaryFrame.FRAME_SIZE]
+    frames = np.frombuffer(data, dtype=FRAME_DTYPE)
+    raw = np.frombuffer(data, dtype=np.uint8).reshape(n, binaryFrame.FRAME_SIZE)
+    # table driven CRC, one vector step per byte position for all frames
+    crc = np.full(n, 0xffff, dtype=np.uint32)
+    for i in range(binaryFrame.FRAME_SIZE - 2):
+        crc = ((crc << 8) & 0xff00) ^ _CRC_TABLE[(crc >> 8) ^ raw[:, i]]
+    valid = (frames['sync'] == binaryFrame.FRAME_SYNC) & (crc == frames['crc'])
+    return frames[valid]
+
+class sensorClient:
+    def __init__(self, port, baudrate=115200, timeout=5.0, retries=3):
+        """
+        Create client and wait for the CLI prompt
+
+        Args:
+            port: serial device path, or an open file descriptor (e.g. a pty
+                  master); only paths can be reopened after errors
+            baudrate: used with pyserial
+            timeout: seconds to wait for a complete response
+            retries: reconnect attempts per command after link errors
+        """
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.retries = retries
+        self._ser = None
+        self._fd = None
+        self._buf = bytearray()
+        self.open()
+
+    def open(self):
+        if isinstance(self.port, int):
+            self._fd = self.port
+        elif serial is not None:
+            self._ser = serial.Serial(self.port, self.baudrate, timeout=0)
+        else:
+            import tty
+            self._fd = os.open(self.port, os.O_RDWR | os.O_NOCTTY)
+            tty.setraw(self._fd)
+        self._buf = bytearray()
+        # an empty line answers with a fresh prompt
+        self._write(b'\n')
+        self._read_until_prompt()
+        time.sleep(0.05)
+        self._drain()
+
+    def close(self):
+        if self._ser is not None:
+            self._ser.close()
+            self._ser = None
+        elif self._fd is not None and not isinstance(self.port, int):
+            os.close(self._fd)
+        self._fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.close()
+
+    def _write(self, data):
+        if self._ser is not None:
+            self._ser.write(data)
+        else:
+            os.write(self._fd, data)
+
+    def _read_some(self, timeout):
+        if self._ser is not None:
+            self._ser.timeout = timeout
+            return self._ser.read(max(1, self._ser.in_waiting))
+        r, _w, _x = select.select([self._fd], [], [], timeout)
+        if not r:
+            return b''
+        data = os.read(self._fd, 65536)
+        if not data:
+            raise OSError('link closed')
+        return data
+
+    def _drain(self):
+        # discards pending output, e.g. extra prompts
+        while self._read_some(0):
+            pass
+        self._buf = bytearray()
+
+    def _fill(self, deadline):
+        _left = deadline - time.monotonic()
+        if _left <= 0:
+            raise sensorError('timeout waiting for the sensor')
+        self._buf += self._read_some(min(_left, 0.1))
+
+    def _read_exact(self, n):
+        deadline = time.monotonic() + self.timeout
+        while len(self._buf) < n:
+            self._fill(deadline)
+        data = bytes(self._buf[:n])
+        del self._buf[:n]
+        return data
+
+    def _read_line(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            i = self._buf.find(b'\n')
+            if i >= 0:
+                line = bytes(self._buf[:i + 1])
+                del self._buf[:i + 1]
+                return line
+            self._fill(deadline)
+
+    def _read_until_prompt(self):
+        # a prompt starts a line, output before it belongs to the command
+        deadline = time.monotonic() + self.timeout
+        start = 0
+        while True:
+            i = self._buf.find(PROMPT, start)
+            while i >= 0:
+                if i == 0 or self._buf[i - 1] in b'\r\n':
+                    data = bytes(self._buf[:i])
+                    del self._buf[:i + len(PROMPT)]
+                    return data
+                i = self._buf.find(PROMPT, i + 1)
+            start = max(0, len(self._buf) - len(PROMPT))
+            self._fill(deadline)
+
+    def _lines(self, line, data):
+        lines = data.decode('utf-8', 'replace').replace('\r', '').split('\n')
+        # the device REPL echoes the command, a pty in raw mode does not
+        if lines and lines[0].strip() == line.strip():
+            lines = lines[1:]
+        return [l for l in lines if l]
+
+    def _retry(self, fn, *args):
+        for attempt in range(self.retries + 1):
+            try:
+                return fn(*args)
+            except (OSError, sensorError) as e:
+                if attempt == self.retries or isinstance(self.port, int):
+                    raise
+                time.sleep(0.5 * (attempt + 1))
+                try:
+                    self.close()
+                    self.open()
+                except (OSError, sensorError):
+                    pass
+
+    def _command(self, line):
+        self._write(line.encode() + b'\n')
+        return self._lines(line, self._read_until_prompt())
+
+    def command(self, line):
+        """sends one command, returns the response lines"""
+        return self._retry(self._command, line)
+
+    def _pipeline(self, lines):
+        # all commands go out at once, the CLI answers them in order
+        self._write(''.join([l + '\n' for l in lines]).encode())
+        return [self._lines(l, self._read_until_prompt()) for l in lines]
+
+    def pipeline(self, lines):
+        """sends several commands in one write, returns a list of responses"""
+        return self._retry(self._pipeline, list(lines))
+
+    def _batch(self, items):
+        line = '; '.join(['%s:%s' % (rid, cmd) for rid, cmd in items]) + ';'
+        self._write(line.encode() + b'\n')
+        lines = self._lines(line, self._read_until_prompt())
+        results = []
+        out = []
+        for l in lines:
+            if l.startswith('@BEGIN') or l.startswith('@END'):
+                continue
+            if l.startswith('@'):
+                rid, _sp, status = l[1:].partition(' ')
+                results.append((rid, out, None if status == 'OK' else status[5:]))
+                out = []
+            else:
+                out.append(l)
+        return results
+
+    def batch(self, commands):
+        """runs several commands in one round trip, commands is a list of
+           command lines or of (id, command line) pairs; returns a list of
+           (id, output lines, error message or None)"""
+        items = [c if isinstance(c, tuple) else (str(i + 1), c)
+                 for i, c in enumerate(commands)]
+        return self._retry(self._batch, items)
+
+    def status(self):
+        """voltage, temperature, power, rate and offset settings in one
+           round trip, as a dict"""
+        res = dict([(rid, (out, err)) for rid, out, err in
+                    self.batch([('v', 'v'), ('t', 't'), ('p', 'p'), ('r', 'r'), ('z', 'z')])])
+        status = {}
+        for rid, key in (('v', 'voltage'), ('t', 'temperature'), ('p', 'power')):
+            out, err = res[rid]
+            # batch readings are key=value
+            status[key] = float(out[-1].split('=')[-1]) if err is None and out else None
+        for rid, key in (('r', 'rate'), ('z', 'offset')):
+            out, err = res[rid]
+            status[key] = out[0][4:] if err is None and out else None
+        return status
+
+    def _check(self, lines):
+        for l in lines:
+            if l.startswith('ERR'):
+                raise sensorError(l)
+        return lines
+
+    def _value(self, cmd):
+        return float(self._check(self.command(cmd))[-1].split()[-1])
+
+    def voltage(self):
+        return self._value('v')
+
+    def temperature(self):
+        return self._value('t')
+
+    def power(self):
+        return self._value('p')
+
+    def _parse_all(self, text):
+        rows = _ALL_RE.findall(text)
+        if np is not None:
+            return np.array(rows, dtype=float).reshape(-1, 3)
+        return [(float(v), float(t), float(p)) for v, t, p in rows]
+
+    def readAll(self):
+        """one snapshot as (voltage, temperature, power)"""
+        rows = self._parse_all('\n'.join(self._check(self.command('a'))))
+        return tuple(rows[0])
+
+    def loop(self, count, period_ms=None):
+        """runs the text loop, all lines are parsed in one pass into an
+           n x 3 array of voltage, temperature, power"""
+        cmd = 'l %d' % count if period_ms is None else 'l %d %d' % (count, period_ms)
+        return self._parse_all('\n'.join(self._check(self.command(cmd))))
+
+    def _frames(self, count):
+        self._write(b'b %d\n' % count)
+        while True:
+            line = self._read_line()
+            if line.startswith(b'ERR'):
+                raise sensorError(line.decode().strip())
+            if line.startswith(b'OK: Starting binary loop'):
+                break
+        data = self._read_exact(count * binaryFrame.FRAME_SIZE)
+        self._read_until_prompt()
+        return _valid_frames(data)
+
+    def frames(self, count):
+        """streams count binary frames, returns the valid ones (NumPy
+           structured array with FRAME_DTYPE or list of tuples)"""
+        return self._retry(self._frames, count)
+
+    def logs(self):
+        """flash logs on the device as [(name, bytes, records)]"""
+        out = []
+        for l in self._check(self.command('d')):
+            if l.startswith('name: '):
+                f = l.split()
+                out.append((f[1], int(f[3]), int(f[5])))
+        return out
+
+    def _download(self, name, filename):
+        self._write(b'd %s\n' % name.encode())
+        while True:
+            line = self._read_line()
+            if line.startswith(b'ERR'):
+                raise sensorError(line.decode().strip())
+            if line.startswith(b'OK: Dumping'):
+                break
+        size = int(line.split()[-2])
+        data = self._read_exact(size)
+        self._read_until_prompt()
+        with open(filename, 'wb') as f:
+            f.write(data)
+        return size
+
+    def download(self, name, filename=None):
+        """copies a flash log to a local file, returns its size; open it
+           with logReader.open_log()"""
+        return self._retry(self._download, name, filename or os.path.basename(name))
+
+    def exit(self):
+        """ends the CLI, no prompt follows"""
+        self._write(b'x\n')
+        try:
+            while not self._read_line().startswith(b'OK: Exiting'):
+                pass
+        except (OSError, sensorError):
+            pass
+
+class asyncSensorClient:
+    # asyncio front end, calls run in a worker thread one at a time
+    def __init__(self, *args, **kwargs):
+        self._client = sensorClient(*args, **kwargs)
+        self._lock = asyncio.Lock()
+
+    async def _call(self, fn, *args):
+        async with self._lock:
+            return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    async def command(self, line):
+        return await self._call(self._client.command, line)
+
+    async def pipeline(self, lines):
+        return await self._call(self._client.pipeline, list(lines))
+
+    async def voltage(self):
+        return await self._call(self._client.voltage)
+
+    async def temperature(self):
+        return await self._call(self._client.temperature)
+
+    async def power(self):
+        return await self._call(self._client.power)
+
+    async def batch(self, commands):
+        return await self._call(self._client.batch, list(commands))
+
+    async def status(self):
+        return await self._call(self._client.status)
+
+    async def readAll(self):
+        return await self._call(self._client.readAll)
+
+    async def loop(self, count, period_ms=None):
+        return await self._call(self._client.loop, count, period_ms)
+
+    async def frames(self, count):
+        return await self._call(self._client.frames, count)
+
+    async def logs(self):
+        return await self._call(self._client.logs)
+
+    async def download(self, name, filename=None):
+        return await self._call(self._client.download, name, filename)
+
+    async def exit(self):
+        return await self._call(self._client.exit)
+
+    def close(self):
+        self._client.close()
+
+def spawn_simulated(root='.', script='cli.py'):
+    """starts script on simulated hardware behind a raw pty,
+       returns (process, master fd)"""
+    import pty
+    import tty
+    import subprocess
+    master, slave = pty.openpty()
+    tty.setraw(slave)
+    proc = subprocess.Popen([sys.executable, 'simMachine.py', script], cwd=root,
+                            stdin=slave, stdout=slave, stderr=slave, close_fds=True)
+    os.close(slave)
+    return proc, master
+
+if __name__ == "__main__":
+    # Hello Client! python -m sensorClient.sensorClient [port]
+    if len(sys.argv) > 1:
+        proc = None
+        client = sensorClient(sys.argv[1])
+    else:
+        proc, fd = spawn_simulated()
+        client = sensorClient(fd, timeout=10.0)
+    print("readAll: ", client.readAll())
+    print("pipeline: ", client.pipeline(['v', 't', 'p']))
+    print("batch: ", client.batch(['v', ('7', 'r'), 'nope']))
+    print("status: ", client.status())
+    print("loop: ", client.loop(5, 50))
+    frames = client.frames(20)
+    print("frames: ", len(frames), frames[:2])
+    print("logs: ", client.logs())
+    client.exit()
+    if proc is not None:
+        proc.wait()
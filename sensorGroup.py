@@ -0,0 +1,132 @@
+# MicroPython group of rfDiodeSensor heads sharing the SPI and I2C buses
+# conversions of all heads run in parallel, the bus serves whichever head
+# is ready next, so the settling time of one ADC is spent reading the others
+import time
+
+class sensorGroup:
+    def __init__(self, sensors):
+        """
+        Create sensor group
+
+        Args:
+            sensors: rfDiodeSensor instances, their AD7791s on separate
+                     chip selects and AD7415s on separate I2C addresses;
+                     a head whose conversion exceeds the timeout derived
+                     from its filter rate is reset and restarted
+        """
+        self.sensors = sensors
+        self.timeouts = [0] * len(sensors)
+        self.running = False
+
+    def __len__(self):
+        return len(self.sensors)
+
+    def _pending(self):
+        _n = 0
+        for rfds in self.sensors:
+            if rfds.voltageSensor.pending:
+                _n += 1
+        return _n
+
+    def _more(self, count, done):
+        # a further conversion is needed only if the ones running cannot
+        # deliver the remaining samples
+        return count is None or count - done > self._pending()
+
+    def stream(self, count=None, once=False):
+        """yields (head index, sample) tuples in the order the heads finish,
+           ends after count samples or on stop(); once: one sample per head,
+           a head is not restarted after its sample"""
+        _n = len(self.sensors)
+        _left = _n
+        for i in range(_n):
+            if self._more(count, 0):
+                self.sensors[i].startConversion()
+        self.running = True
+        _done = 0
+        _next = 0
+        try:
+            while self.running and (count is None or _done < count) and _left:
+                _idle = True
+                # round-robin, starting after the head served last
+                for _k in range(_n):
+                    i = (_next + _k) % _n
+                    rfds = self.sensors[i]
+                    vsensor = rfds.voltageSensor
+                    code = vsensor.pollCode()
+                    if code is None:
+                        if vsensor.pending and vsensor.expired():
+                            self.timeouts[i] += 1
+                            vsensor.flagTimeout()
+                            vsensor.recover()
+                            rfds.startConversion()
+                        continue
+                    # restart before doing anything else with the result,
+                    # unless that conversion would not be used: the head's
+                    # only sample in once mode, or count already covered
+                    if (rfds.filter is not None or not once) and self._more(count, _done + 1):
+                        rfds.startConversion()
+                    if rfds.filter is not None:
+                        code = rfds.filter.process(code)
+                        if code is None:
+                            if not vsensor.pending and self._more(count, _done):
+                                rfds.startConversion()
+                            continue
+                    if once:
+                        vsensor.cancelConversion()
+                        _left -= 1
+                    yield (i, rfds.makeSample(code))
+                    _done += 1
+                    _next = i + 1
+                    _idle = False
+                    break
+                if _idle:
+                    time.sleep_ms(1)
+        finally:
+            self.running = False
+            # conversions still running belong to no sample, a later read
+            # must not pick them up with new ticks
+            for rfds in self.sensors:
+                rfds.voltageSensor.cancelConversion()
+
+    def stop(self):
+        self.running = False
+
+    def snapshot(self):
+        """one sample of every head, list in head order"""
+        samples = [None] * len(self.sensors)
+        for i, s in self.stream(None, once=True):
+            samples[i] = s
+        return samples
+
+if __name__ == "__main__":
+    # Hello Sensor Group! two heads on SPI0 with chip selects on GP5 and GP3,
+    # AD7415s at I2C addresses 72 and 73
+    import machine
+    from machine import Pin, SPI, I2C
+    import voltageSensor
+    import temperatureSensor
+    import rfDiodeSensor
+    if hasattr(machine, 'ad7791'):
+        # simulated hardware: attach the second set of devices
+        machine.ad7791(0, cs=5)
+        machine.ad7791(0, cs=3)
+        machine.ad7415(0, 72)
+        machine.ad7415(0, 73)
+    nRDY = Pin(4)
+    spi = SPI(0, baudrate=100000, polarity=1, phase=1, bits=8,
+              firstbit=SPI.MSB, sck=Pin(6), mosi=Pin(7), miso=nRDY)
+    i2c = I2C(0, scl=Pin(9), sda=Pin(8), freq=100000)
+    heads = []
+    for cs, adr in ((5, 72), (3, 73)):
+        vsensor = voltageSensor.voltageSensor(spi, nRDY, Pin(cs, Pin.OUT, value=1))
+        tsensor = temperatureSensor.temperatureSensor(i2c, adr)
+        heads.append(rfDiodeSensor.rfDiodeSensor(vsensor, tsensor))
+    group = sensorGroup(heads)
+    t0 = time.ticks_ms()
+    for i, s in group.stream(40):
+        print("head: %d voltage: %f temperature: %.2f power: %f" % (i, s.voltage, s.temperature, s.power))
+    print("sps: ", 40000 / time.ticks_diff(time.ticks_ms(), t0), "timeouts: ", group.timeouts)
+    # no head is left with a conversion that a later read would take as new
+    print("snapshot: ", group.snapshot())
+    assert not any(h.voltageSensor.pending for h in heads)
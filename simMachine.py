@@ -0,0 +1,440 @@
+"""
+Simulated machine module for running the sensor stack on CPython
+
+Emulates the AD7791 (communications/status/mode/filter/data registers,
+nRDY timing per filter rate, single and continuous conversion, CREAD)
+behind SPI and the AD7415 (pointer, temperature and configuration
+registers) behind I2C. Bus transfers take the time they would take at
+the configured clock rate.
+
+Usage:
+    import simMachine
+    simMachine.install()        # before importing voltageSensor etc.
+
+    python simMachine.py cli.py # run a script on simulated hardware
+"""
+import sys
+import time
+import random
+import threading
+
+# Signal seen by the simulated devices, change at will
+
+ain_voltage = 0.5       # AIN(+)-AIN(-) of the AD7791 in V
+noise_voltage = 2e-6    # rms noise added to every conversion in V
+offset_voltage = 0.0    # ADC offset, also seen on the shorted input
+vdd_voltage = 3.3       # supply seen by the Vdd monitor channel
+temperature = 25.0      # AD7415 die temperature in °C
+
+realtime_bus = True     # transfers take their bus time
+
+_TICKS_PERIOD = 1 << 30
+_TICKS_MAX = _TICKS_PERIOD - 1
+_TICKS_HALFPERIOD = _TICKS_PERIOD // 2
+
+def ticks_ms():
+    return int(time.monotonic() * 1000) & _TICKS_MAX
+
+def ticks_us():
+    return int(time.monotonic() * 1000000) & _TICKS_MAX
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) & _TICKS_MAX
+
+def ticks_diff(ticks1, ticks2):
+    return ((ticks1 - ticks2 + _TICKS_HALFPERIOD) & _TICKS_MAX) - _TICKS_HALFPERIOD
+
+def sleep_ms(ms):
+    time.sleep(ms / 1000)
+
+def sleep_us(us):
+    time.sleep(us / 1000000)
+
+def _bus_delay(seconds):
+    if realtime_bus:
+        _end = time.perf_counter() + seconds
+        while time.perf_counter() < _end:
+            pass
+
+# Pin levels by pin id, shared by all Pin objects with the same id
+_pin_state = {}
+
+class Pin:
+    IN = 0
+    OUT = 1
+    PULL_UP = 1
+    IRQ_FALLING = 4
+    IRQ_RISING = 8
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        self.id = id
+        if value is not None:
+            _pin_state[id] = 1 if value else 0
+        else:
+            _pin_state.setdefault(id, 0)
+        self._source = None
+        self._irq = None
+
+    def value(self, *args):
+        if args:
+            _pin_state[self.id] = 1 if args[0] else 0
+            return None
+        if self._source is not None:
+            return self._source()
+        return _pin_state[self.id]
+
+    def __call__(self, *args):
+        return self.value(*args)
+
+    def on(self):
+        _pin_state[self.id] = 1
+
+    def off(self):
+        _pin_state[self.id] = 0
+
+    def irq(self, handler=None, trigger=IRQ_FALLING, hard=False):
+        if self._irq is not None:
+            self._irq.stop()
+            self._irq = None
+        if handler is not None:
+            self._irq = _pinIrq(self, handler, trigger)
+        return self._irq
+
+    def __repr__(self):
+        return 'Pin(%s)' % self.id
+
+class _pinIrq:
+    # polls the pin in a background thread and calls the handler on edges,
+    # like a soft IRQ handler it runs outside the interrupted code
+    def __init__(self, pin, handler, trigger):
+        self._pin = pin
+        self._handler = handler
+        self._trigger = trigger
+        self._running = True
+        self._thread = threading.Thread(target=self._poll, daemon=True)
+        self._thread.start()
+
+    def _poll(self):
+        _last = self._pin.value()
+        while self._running:
+            _v = self._pin.value()
+            if _v != _last:
+                if (_v == 0 and self._trigger & Pin.IRQ_FALLING) or \
+                   (_v == 1 and self._trigger & Pin.IRQ_RISING):
+                    self._handler(self._pin)
+                    _v = self._pin.value()
+                _last = _v
+            time.sleep(0.0002)
+
+    def stop(self):
+        self._running = False
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+
+class simAD7791:
+    # update rates in sps selected by FS2..FS0
+    RATES = (120.0, 100.0, 33.3, 20.0, 16.6, 16.7, 13.3, 9.5)
+
+    def __init__(self, ref_voltage=2.5):
+        self.ref_voltage = ref_voltage
+        self.conversions = 0
+        self.reset()
+
+    def reset(self):
+        self.mode = 0x02
+        self.filter = 0x04
+        self.channel = 0
+        self._ones = 0
+        self._state = 'comm'
+        self._out = []
+        self._cread = False
+        self._cread_pos = 0
+        self._data = 0
+        self._ready = False
+        self._completed = 0
+        self._start(time.monotonic())
+
+    @property
+    def period(self):
+        return (1 << ((self.filter >> 4) & 0x03)) / self.RATES[self.filter & 0x07]
+
+    def _start(self, now):
+        self._t0 = now
+        self._completed = 0
+        self._ready = False
+
+    def _convert(self):
+        if self.channel == 0:
+            v = ain_voltage
+        elif self.channel == 2:
+            v = 0.0
+        elif self.channel == 3:
+            # Vdd/5 against the internal 1.17 V reference, scaled to Vref
+            v = vdd_voltage / 5 / 1.17 * self.ref_voltage
+        else:
+            v = 0.0
+        v += offset_voltage + random.gauss(0.0, noise_voltage)
+        if self.mode & 0x04:
+            code = int(v / self.ref_voltage * 0x1000000)
+        else:
+            code = int((v / self.ref_voltage + 1.0) * 0x800000)
+        self._data = min(max(code, 0), 0xffffff)
+        self.conversions += 1
+        self._ready = True
+
+    def _update(self):
+        md = self.mode & 0xc0
+        if md == 0xc0 or md == 0x40:
+            return
+        # first result after two update periods, then one per period
+        n = int((time.monotonic() - self._t0) / self.period) - 1
+        if md == 0x80:
+            n = min(n, 1)
+        if n > self._completed:
+            self._completed = n
+            self._convert()
+            if md == 0x80:
+                self.mode |= 0xc0
+
+    def nrdy(self):
+        self._update()
+        return 0 if self._ready else 1
+
+    def _read_data(self):
+        self._update()
+        d = self._data
+        self._ready = False
+        return [(d >> 16) & 0xff, (d >> 8) & 0xff, d & 0xff]
+
+    def transfer(self, b):
+        """clocks one byte in on DIN, returns the byte clocked out on DOUT"""
+        # 32 ones on DIN reset the interface in any state, CREAD included
+        self._ones = self._ones + 1 if b == 0xff else 0
+        if self._ones >= 4:
+            self.reset()
+            return 0xff
+        if self._cread:
+            if self._cread_pos == 0:
+                if b == 0x38:
+                    self._cread = False
+                    self._out = self._read_data()
+                    self._state = 'read'
+                    return 0xff
+                self._cread_bytes = self._read_data()
+            r = self._cread_bytes[self._cread_pos]
+            self._cread_pos = (self._cread_pos + 1) % 3
+            return r
+        if self._state == 'read':
+            r = self._out.pop(0)
+            if not self._out:
+                self._state = 'comm'
+            return r
+        if self._state == 'mode':
+            self.mode = b
+            self._state = 'comm'
+            if b & 0xc0 != 0xc0:
+                self._start(time.monotonic())
+            return 0xff
+        if self._state == 'filter':
+            self.filter = b
+            self._state = 'comm'
+            return 0xff
+        # communications register
+        if b & 0x80:
+            return 0xff
+        rs = (b >> 4) & 0x03
+        self.channel = b & 0x03
+        if b & 0x08:
+            if rs == 0:
+                self._out = [(0 if self.nrdy() == 0 else 0x80) | 0x04 | self.channel]
+            elif rs == 1:
+                self._out = [self.mode]
+            elif rs == 2:
+                self._out = [self.filter]
+            else:
+                if b & 0x04:
+                    self._cread = True
+                    self._cread_pos = 0
+                    return 0xff
+                self._out = self._read_data()
+            self._state = 'read'
+        elif rs == 1:
+            self._state = 'mode'
+        elif rs == 2:
+            self._state = 'filter'
+        return 0xff
+
+class simAD7415:
+    def __init__(self):
+        self.pointer = 0
+        self.config = 0x40
+        self._temperature = temperature
+
+    def _register(self):
+        if self.config & 0x80 == 0:
+            self._temperature = temperature
+        code = int(round(self._temperature * 4)) & 0x3ff
+        return code << 6
+
+    def write(self, data):
+        if len(data) >= 1:
+            self.pointer = data[0]
+        if len(data) >= 2 and self.pointer == 0x01:
+            self.config = data[1] & 0xfc
+            # one-shot: convert once, the bit clears itself
+            if data[1] & 0x04:
+                self._temperature = temperature
+
+    def read(self, n):
+        if self.pointer == 0x00:
+            r = self._register()
+            data = [r >> 8, r & 0xff]
+        elif self.pointer == 0x01:
+            data = [self.config]
+        else:
+            data = [0xff]
+        return (data * n)[:n]
+
+# Devices attached to the simulated buses, keyed by bus id and chip select
+# pin id (None: CS tied low) or I2C address
+
+spi_devices = {}
+i2c_devices = {}
+
+def ad7791(bus=0, cs=None):
+    devices = spi_devices.setdefault(bus, {})
+    if cs not in devices:
+        devices[cs] = simAD7791()
+    return devices[cs]
+
+def ad7415(bus=0, adr=73):
+    devices = i2c_devices.setdefault(bus, {})
+    if adr not in devices:
+        devices[adr] = simAD7415()
+    return devices[adr]
+
+class SPI:
+    MSB = 0
+    LSB = 1
+
+    def __init__(self, id, baudrate=1000000, polarity=0, phase=0, bits=8,
+                 firstbit=MSB, sck=None, mosi=None, miso=None):
+        self.id = id
+        self.baudrate = baudrate
+        if not spi_devices.get(id):
+            ad7791(id)
+        self.bytes = 0
+        if miso is not None:
+            miso._source = self._nrdy
+
+    def _selected(self):
+        # the device whose chip select is low, else the one without CS
+        devices = spi_devices[self.id]
+        for cs, dev in devices.items():
+            if cs is not None and _pin_state.get(cs, 1) == 0:
+                return dev
+        return devices.get(None)
+
+    def _nrdy(self):
+        dev = self._selected()
+        # DOUT/nRDY floats high without a selected device
+        return dev.nrdy() if dev is not None else 1
+
+    def _transfer(self, out, into):
+        _bus_delay(len(out) * 8 / self.baudrate)
+        self.bytes += len(out)
+        dev = self._selected()
+        for i in range(len(out)):
+            r = dev.transfer(out[i]) if dev is not None else 0xff
+            if into is not None:
+                into[i] = r
+
+    def write(self, buf):
+        self._transfer(buf, None)
+
+    def read(self, n, write=0x00):
+        into = bytearray(n)
+        self._transfer(bytes([write]) * n, into)
+        return bytes(into)
+
+    def readinto(self, buf, write=0x00):
+        self._transfer(bytes([write]) * len(buf), buf)
+
+    def write_readinto(self, out, into):
+        self._transfer(out, into)
+
+class I2C:
+    def __init__(self, id, scl=None, sda=None, freq=400000):
+        self.id = id
+        self.freq = freq
+        self.transactions = 0
+        self.bytes = 0
+        # a bus without attached devices gets one AD7415-0 with AS=GND
+        if not i2c_devices.get(id):
+            ad7415(id, 73)
+
+    def _device(self, addr):
+        devices = i2c_devices.get(self.id, {})
+        if addr not in devices:
+            raise OSError(19)   # ENODEV, like a missing ACK
+        return devices[addr]
+
+    def _bus(self, nbytes):
+        # start + address byte + data bytes, 9 clocks each, + stop
+        self.transactions += 1
+        self.bytes += nbytes
+        _bus_delay((2 + 9 * (1 + nbytes)) / self.freq)
+
+    def scan(self):
+        return sorted(i2c_devices.get(self.id, {}).keys())
+
+    def writeto(self, addr, buf, stop=True):
+        dev = self._device(addr)
+        self._bus(len(buf))
+        dev.write(buf)
+        return len(buf)
+
+    def readfrom_into(self, addr, buf, stop=True):
+        dev = self._device(addr)
+        self._bus(len(buf))
+        data = dev.read(len(buf))
+        for i in range(len(buf)):
+            buf[i] = data[i]
+
+    def readfrom(self, addr, nbytes, stop=True):
+        buf = bytearray(nbytes)
+        self.readfrom_into(addr, buf)
+        return bytes(buf)
+
+    def writeto_mem(self, addr, memaddr, buf):
+        dev = self._device(addr)
+        self._bus(1 + len(buf))
+        dev.write(bytes([memaddr]) + bytes(buf))
+
+    def readfrom_mem_into(self, addr, memaddr, buf):
+        # pointer write and read with repeated start, one transaction
+        dev = self._device(addr)
+        self._bus(2 + len(buf))
+        dev.write(bytes([memaddr]))
+        data = dev.read(len(buf))
+        for i in range(len(buf)):
+            buf[i] = data[i]
+
+def install():
+    """makes this module importable as machine and adds the MicroPython
+       time functions to the time module"""
+    sys.modules['machine'] = sys.modules[__name__]
+    for name in ('ticks_ms', 'ticks_us', 'ticks_add', 'ticks_diff', 'sleep_ms', 'sleep_us'):
+        if not hasattr(time, name):
+            setattr(time, name, globals()[name])
+
+if __name__ == "__main__":
+    # run a script on simulated hardware: python simMachine.py cli.py [args]
+    import runpy
+    install()
+    if len(sys.argv) < 2:
+        print("usage: python simMachine.py <script.py> [args]")
+        sys.exit(1)
+    sys.argv = sys.argv[1:]
+    sys.path.insert(0, '.')
+    runpy.run_path(sys.argv[0], run_name='__main__')
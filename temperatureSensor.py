@@ -4,16 +4,41 @@ from machine import Pin, I2C
 import time
 
 class temperatureSensor:
-    def __init__(self):
-        # Initialize sensor hardware
-        self.i2c = I2C(0, scl=Pin(9), sda=Pin(8), freq=100000)
-        self.tsensor = AD7415.AD7415(self.i2c)
+    def __init__(self, i2c=None, adr=73, oneShot=False):
+        # Initialize sensor hardware, i2c defaults to the on-board bus,
+        # pass another (e.g. simulated) bus object to override
+        if i2c is None:
+            i2c = I2C(0, scl=Pin(9), sda=Pin(8), freq=100000)
+        self.i2c = i2c
+        self.tsensor = AD7415.AD7415(self.i2c, adr)
+        self.setOneShot(oneShot)
+
+    def setOneShot(self, on=True):
+        #power down between readings, every reading is a one-shot
+        #conversion; less self-heating next to the diode in long captures
+        self.tsensor.power_down(on)
  
     def readTemperature(self):
         return(self.tsensor.read_Temperature())
 
+    def readCode(self):
+        #raw 16-bit temperature register, 10-bit value left aligned
+        return(self.tsensor.read_code())
+
+    def readQuarters(self):
+        #temperature in integer 1/4 °C, for the fixed-point path
+        return(self.tsensor.read_quarters())
+
+    def readMany(self, n, codes=None):
+        #n raw temperature codes, one conversion each
+        return(self.tsensor.read_many(n, codes))
+
 if __name__ == "__main__":
     # Hello Temperature Sensor!
     temp_sensor = temperatureSensor()
     for i in range(10):
         print(temp_sensor.readTemperature())
+    # a fresh driver reads the configuration before a one-shot changes it
+    ad7415 = AD7415.AD7415(temp_sensor.i2c, temp_sensor.tsensor._adr)
+    print("one-shot: ", AD7415.code_to_celsius(int.from_bytes(ad7415.read_oneshot(), 'big')),
+          "config: ", hex(ad7415.config))
@@ -1,38 +1,422 @@
 # Micropython class for voltage sensor
 
 import AD7791.AD7791 as AD7791
+import acquisitionEngine
+import acquisitionProfiles
+import adaptiveRate
+import instrumentation
 from machine import Pin, SPI
 import time
+from array import array
+
+#a result is expected 1/32 of the predicted conversion time early, the
+#AD7791 internal clock is not exact; nRDY is then polled in steps of a
+#quarter of that margin, but at least _POLL_US, so a wait takes about
+#five polls at any filter rate
+_EARLY_SHIFT = 5
+_POLL_US = 250
+#extra time on top of one settling time before a wait times out
+_TIMEOUT_MARGIN_US = 2000
+
+class conversionTimeout(Exception):
+    pass
 
 class voltageSensor:
-    def __init__(self):
-        # Initialize ADC hardware
-        self.nRDY = Pin(4)
-        self.spi = SPI(0, baudrate=100000, polarity=1, phase=1, bits=8,\
-                       firstbit=SPI.MSB, sck=Pin(6), mosi=Pin(7), miso=self.nRDY)
-        self.adc = AD7791.AD7791(self.spi, self.nRDY, ref_voltage=2.5)
+    def __init__(self, spi=None, nRDY=None, cs=None):
+        # Initialize ADC hardware, spi and nRDY default to the on-board
+        # bus, pass other (e.g. simulated or shared) bus objects and a
+        # chip select pin to override
+        self.nRDY = nRDY if nRDY is not None else Pin(4)
+        if spi is None:
+            spi = SPI(0, baudrate=100000, polarity=1, phase=1, bits=8,\
+                      firstbit=SPI.MSB, sck=Pin(6), mosi=Pin(7), miso=self.nRDY)
+        self.spi = spi
+        self.adc = AD7791.AD7791(self.spi, self.nRDY, ref_voltage=2.5, cs=cs)
+        #CDIV1, 16.6sps unless changed with setRate() or setProfile()
+        self.rate = ("CDIV1", "16.6sps")
+        self.profile = acquisitionProfiles.DEFAULT
+        self.profileName = 'default'
+        self.adaptive = None
+        self.pending = False
+        self.configure()
+        self.streaming = False
+        self.engine = None
+        #samples read by the last readBlock(), less than n after a timeout
+        self.blockCount = 0
+        #conversion timeouts, each one resets and reconfigures the ADC
+        self.timeouts = 0
+        #offsetTracker.offsetTracker, None for no offset correction
+        self.offset = None
+        #channel of the running zero conversion, None for AIN
+        self._zeroChannel = None
+        self._ready = time.ticks_us()
+        self._expect(self.adc.settling_time_us())
+
+    def configure(self):
         self.adc.reset()
-        #set filter to CDIV1, 16.6sps:
-        self.adc.write_filter("CDIV1", "16.6sps")
+        if self.adaptive is not None:
+            self.adaptive.start()
+        else:
+            self.adc.write_filter(self.rate[0], self.rate[1])
+
+    def setRate(self, cdiv, fadc):
+        #fixed update rate, ends adaptive mode and the profile
+        self.rate = (cdiv, fadc)
+        self.adaptive = None
+        self.profile = None
+        self.profileName = None
+        self.adc.write_filter(cdiv, fadc)
+
+    def setProfile(self, name):
+        #switches to a named acquisitionProfiles profile, its filter applies
+        #to single conversions, a continuous profile also sets the coding
+        #used by stream() and readBlock(); no allocation, at most one write
+        profile = acquisitionProfiles.get(name)
+        self.rate = profile.rate
+        self.adaptive = None
+        self.profile = profile
+        self.profileName = name
+        if profile.continuous:
+            self.adc.write_filter(profile.rate[0], profile.rate[1])
+        else:
+            self.adc.apply_profile(profile)
+
+    def setAdaptive(self, on=True, **kwargs):
+        #switch between fast and slow update rates driven by the
+        #sample-to-sample variance, applies to single conversions only
+        if on:
+            self.adaptive = adaptiveRate.adaptiveRate(self.adc, **kwargs)
+            self.adaptive.start()
+        else:
+            self.setRate(self.rate[0], self.rate[1])
+
+    def recover(self):
+        #after a timeout: reset the ADC and restore rate, profile or adaptive
+        #mode; a running acquisition engine is restarted afterwards
+        _engine = self.engine is not None and self.engine.running
+        if _engine:
+            self.engine.abort()
+        self.pending = False
+        self._zeroChannel = None
+        self.configure()
+        if _engine:
+            self.engine.start()
+
+    def _expect(self, us, since=None):
+        #the next result is due us after since (default now), waiting for it
+        #times out one settling time of the active filter rate later
+        if since is None:
+            since = time.ticks_us()
+        _early = us >> _EARLY_SHIFT
+        self._due = time.ticks_add(since, us - _early)
+        self._poll_us = max(_POLL_US, _early >> 2)
+        self._deadline = time.ticks_add(since, us + self.adc.settling_time_us() + _TIMEOUT_MARGIN_US)
+
+    def remainingUs(self):
+        #time until the expected result, negative when it is due
+        return time.ticks_diff(self._due, time.ticks_us())
+
+    def expired(self):
+        return time.ticks_diff(time.ticks_us(), self._deadline) > 0
+
+    def catchUp(self, left):
+        #the caller comes back late (e.g. a slow stream consumer), left < 0
+        #from remainingUs(): the timeout window counts from now, not from
+        #the previous sample
+        self._deadline = time.ticks_add(self._deadline, -left)
+
+    def flagTimeout(self):
+        self.timeouts += 1
+        instrumentation.timeout(instrumentation.CONV_WAIT)
+
+    def waitReady(self):
+        #sleeps through the predicted conversion time, then polls nRDY in
+        #fine steps; returns False once the settling-time derived timeout
+        #has passed
+        _t = instrumentation.start()
+        _left = self.remainingUs()
+        if _left > 0:
+            time.sleep_ms(_left // 1000)
+            time.sleep_us(_left % 1000)
+        else:
+            self.catchUp(_left)
+        while True:
+            if self.adc.ready():
+                self._ready = time.ticks_us()
+                instrumentation.stop(instrumentation.CONV_WAIT, _t)
+                return True
+            if self.expired():
+                break
+            time.sleep_us(self._poll_us)
+        self.flagTimeout()
+        return False
+
+    def setOffsetTracker(self, tracker):
+        #interleave zero conversions and subtract the tracked offset from
+        #all codes, None switches the correction off
+        self.offset = tracker
+        self._zeroChannel = None
+
+    def _startSingle(self):
+        #unipolar AIN single conversion, or a zero conversion when the
+        #offset tracker is due
+        if self.offset is not None and self.offset.due():
+            _channel, _coding = self.offset.channel()
+            self.adc.start_single_conversion(_channel, _coding)
+            self._zeroChannel = _channel
+        else:
+            self.adc.start_unipolar_single_conversion()
+        self._expect(self.adc.settling_time_us())
+
+    def _result(self, code):
+        #zero conversions update the tracker and return None, signal codes
+        #are offset corrected
+        if self._zeroChannel is not None:
+            self.offset.update(self._zeroChannel, code)
+            self._zeroChannel = None
+            return(None)
+        if self.offset is not None:
+            return(self.offset.correct(code))
+        return(code)
+
+    def readCode(self):
+        #returns the raw unipolar code, None on timeout after which the ADC
+        #is reset and reconfigured; consume from the acquisition buffer
+        #while it is running
+        if self.engine is not None and self.engine.running:
+            _code = self.engine.get()
+            if _code is None:
+                self.flagTimeout()
+                self.recover()
+                return(None)
+            if self.offset is None:
+                return(_code)
+            return(self.offset.correct(_code))
+        while True:
+            #start a single conversion unless one is already running
+            if self.pending:
+                self.pending = False
+            else:
+                self._startSingle()
+            if not self.waitReady():
+                self._zeroChannel = None
+                self.recover()
+                return(None)
+            _code = self._result(self.adc.read_code())
+            if _code is None:
+                continue
+            #adaptive mode discards the first result after a rate change
+            if self.adaptive is None or self.adaptive.process(_code):
+                return(_code)
+
+    def startConversion(self):
+        #starts the next single conversion ahead of readCode(), so the
+        #conversion time overlaps with whatever the caller does meanwhile
+        if self.engine is not None and self.engine.running:
+            return
+        if not self.pending:
+            self._startSingle()
+            self.pending = True
+
+    def cancelConversion(self):
+        #forgets a pending conversion whose result is not wanted any more,
+        #the next start rewrites the mode register and restarts the ADC
+        self.pending = False
+        self._zeroChannel = None
+
+    def pollCode(self):
+        #non-blocking: returns the code of a finished pending conversion,
+        #None while it is still converting or when none is pending
+        if not self.pending or not self.adc.ready():
+            return(None)
+        self.pending = False
+        _code = self._result(self.adc.read_code())
+        #after a zero conversion, adaptive mode discards the first result
+        #after a rate change
+        if _code is None or (self.adaptive is not None and not self.adaptive.process(_code)):
+            self.startConversion()
+            return(None)
+        return(_code)
+
+    def codeToVoltage(self, code):
+        return(self.adc.unipolar_voltage(code))
+
+    def codeToMicrovolts(self, code):
+        #integer µV, the fixed-point counterpart of codeToVoltage()
+        return(self.adc.unipolar_microvolts(code))
 
     def readVoltage(self):
-        #start unipolar single conversion
-        _maxtries = 2000
-        _ctr=0
-        self.adc.start_unipolar_single_conversion()
-        for _i in range(_maxtries):
-            time.sleep_ms(1);
-            _ctr+=1
-            if(self.adc.nRDY.value() == 0):
+        #raises conversionTimeout instead of returning a made-up value
+        _code = self.readCode()
+        if _code is None:
+            raise conversionTimeout("AD7791 conversion timeout")
+        return(self.adc.unipolar_voltage(_code))
+
+    def _startContinuous(self, profile=None):
+        #continuous conversions with continuous read, a continuous profile
+        #is applied in one transfer, otherwise unipolar at the current rate
+        if profile is None:
+            profile = self.profile
+        if profile is not None and profile.continuous:
+            #more than the continuous read command restarts the conversion
+            _restart = self.adc.apply_profile(profile) > 1
+        else:
+            _restart = self.adc.set_coding(AD7791.UNIPOLAR_CODING)
+            self.adc.start_continuous_conversion()
+        #a restarted filter settles first, otherwise results keep coming
+        self._expect(self.adc.settling_time_us() if _restart else self.adc.period_us())
+
+    def stream(self, count=None):
+        #yields voltages from continuous conversions at the full filter
+        #rate, ends after count samples, on stopStream() or on timeout;
+        #unipolar unless a bipolar profile is set
+        self._startContinuous()
+        if self.profile is not None and self.profile.coding == AD7791.BIPOLAR_CODING:
+            _read = self.adc.read_bipolar_ADC_voltage
+        else:
+            _read = self.adc.read_unipolar_ADC_voltage
+        #the tracked offset is not updated while streaming, only subtracted
+        _off = 0.0 if self.offset is None else self.codeToVoltage(self.offset.offset)
+        self.streaming = True
+        _n = 0
+        _timeout = False
+        try:
+            while self.streaming and (count is None or _n < count):
+                if not self.waitReady():
+                    _timeout = True
+                    break
+                _v = _read() - _off
+                self._expect(self.adc.period_us(), self._ready)
+                yield _v
+                _n += 1
+        finally:
+            self.streaming = False
+            #after a timeout the ADC is reset right away, a second wait
+            #would double the stall and count it twice
+            if not _timeout and self.waitReady():
+                self.adc.stop_continuous_read()
+            else:
+                self.recover()
+
+    def readBlock(self, n, raw=None, codes=None, out=None, profile=None):
+        #reads n continuous conversions into one contiguous raw buffer and
+        #converts them in one pass, pass preallocated raw (3*n bytes),
+        #codes (array('l') of n) and out (array('f') of n) or larger buffers
+        #to avoid allocations; returns a view of the blockCount voltages in
+        #out; profile overrides the continuous profile set with setProfile()
+        if raw is None:
+            raw = bytearray(3 * n)
+        if codes is None:
+            codes = array('l', [0] * n)
+        if out is None:
+            out = array('f', bytearray(4 * n))
+        self._startContinuous(profile)
+        _k = 0
+        _timeout = False
+        for _i in range(n):
+            if not self.waitReady():
+                _timeout = True
                 break
-        if _ctr < _maxtries:
-            _v = self.adc.read_unipolar_ADC_voltage()
+            self.adc.read_raw_into(raw, _k)
+            self._expect(self.adc.period_us(), self._ready)
+            _k += 3
+        self.blockCount = _k // 3
+        if not _timeout and self.waitReady():
+            self.adc.stop_continuous_read()
         else:
-            _v = 0.0
-        return(_v)
+            self.recover()
+        #only the samples read are converted, shorter than the buffers
+        #after a timeout or when n is less than their size
+        _n = self.blockCount
+        codes = memoryview(codes)[:_n]
+        AD7791.raw_to_codes(memoryview(raw)[:3 * _n], codes)
+        if self.offset is not None:
+            _bipolar = self.adc.bipolar()
+            for _i in range(_n):
+                codes[_i] = self.offset.correct(codes[_i], _bipolar)
+        return self.adc.codes_to_voltage(codes, memoryview(out)[:_n])
+
+    def readBurst(self, n, raw=None, codes=None, out=None):
+        #readBlock() with the fast profile, the configured rate (or
+        #adaptive mode) is restored afterwards
+        if self.engine is not None and self.engine.running:
+            raise RuntimeError("acquisition running")
+        try:
+            return self.readBlock(n, raw, codes, out, acquisitionProfiles.FAST)
+        finally:
+            if self.adaptive is not None:
+                self.adaptive.start()
+            else:
+                self.adc.write_filter(self.rate[0], self.rate[1])
+
+    def stopStream(self):
+        #ends a running stream() after the current sample
+        self.streaming = False
+
+    def startAcquisition(self, size=256):
+        #interrupt driven continuous conversions into a ring buffer
+        if self.engine is None or self.engine.buffer.size != size:
+            self.engine = acquisitionEngine.acquisitionEngine(self.adc, size)
+        self.engine.start()
+
+    def stopAcquisition(self):
+        if self.engine is not None and self.engine.running:
+            if not self.engine.stop():
+                self.flagTimeout()
+                self.recover()
+
+    @property
+    def overruns(self):
+        return self.engine.overruns if self.engine is not None else 0
 
 if __name__ == "__main__":
     # Hello Voltage Sensor!
     volt_sensor = voltageSensor()
     for i in range(10):
-        print(volt_sensor.readVoltage())
\ No newline at end of file
+        print(volt_sensor.readVoltage())
+    # Stream 100 samples in continuous conversion mode
+    _t0 = time.ticks_ms()
+    for v in volt_sensor.stream(100):
+        print(v)
+    print("sps: ", 100000 / time.ticks_diff(time.ticks_ms(), _t0))
+    # a caller coming back later than the whole timeout window, e.g. a slow
+    # stream consumer, while nRDY is still high must not time out
+    _timeouts = volt_sensor.timeouts
+    volt_sensor._expect(volt_sensor.adc.period_us())
+    time.sleep_ms(3 * volt_sensor.adc.settling_time_us() // 1000)
+    volt_sensor.adc.start_unipolar_single_conversion()
+    print("late caller ready: ", volt_sensor.waitReady(), "timeouts: ",
+          volt_sensor.timeouts - _timeouts)
+    assert volt_sensor.timeouts == _timeouts
+    volt_sensor.adc.read_code()
+    # a short block into larger buffers converts only the samples read
+    _codes = array('l', [-1] * 16)
+    _out = volt_sensor.readBlock(4, bytearray(48), _codes, array('f', bytearray(64)))
+    print("short block: ", list(_out))
+    assert len(_out) == 4 and _codes[4] == -1
+    import machine
+    if hasattr(machine, 'ad7791'):
+        # a stalled ADC counts one timeout per stall and reads again after
+        # the reset: buffered, single, streamed and block reads
+        _sim = machine.ad7791()
+        _update = type(_sim)._update
+        def _stalled(name, read):
+            _timeouts = volt_sensor.timeouts
+            type(_sim)._update = lambda self: None
+            _sim._ready = False
+            _t0 = time.ticks_ms()
+            read()
+            type(_sim)._update = _update
+            print("stalled", name, "timeouts: ", volt_sensor.timeouts - _timeouts,
+                  "ms: ", time.ticks_diff(time.ticks_ms(), _t0))
+            assert volt_sensor.timeouts - _timeouts == 1
+        volt_sensor.startAcquisition(16)
+        time.sleep_ms(100)
+        volt_sensor.engine.buffer.clear()
+        _stalled("engine", volt_sensor.readCode)
+        assert volt_sensor.engine.running and volt_sensor.readCode() is not None
+        volt_sensor.stopAcquisition()
+        _stalled("single", volt_sensor.readCode)
+        _stalled("stream", lambda: list(volt_sensor.stream(5)))
+        _stalled("block", lambda: volt_sensor.readBlock(5))
+        assert abs(volt_sensor.readVoltage() - machine.ain_voltage) < 0.001